@@ -0,0 +1,244 @@
+"""`fetch_bookings`的基准测试
+
+在模拟服务器上，对房间数 × 周数 × 每页房间数 × 并发数的各个组合，测量以下指标。
+
+- 总用时，及吞吐量（每秒获取的房间·周数）
+- 首批结果用时（`iter_booking_pages`第一次 yield）
+- CPU 用时
+- 内存峰值（tracemalloc）
+- 解析用时（`parse_bookings_data`，不含网络）
+
+前三项是模拟的网络用时：事件循环使用虚拟时钟，无事可做时直接跳到下一个定时器，
+因此模拟延迟按真实尺度计算却不必真的等待，且不受 CPU 用时影响。
+CPU 用时另行测量（真实时间，含模拟服务器生成响应）；
+内存峰值另跑一遍测量，以免 tracemalloc 拖慢计时。
+
+    $ python benchmarks/bench_fetch.py --rooms 50 --rooms 200 --concurrency 4
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import tracemalloc
+from dataclasses import asdict, dataclass
+from itertools import product
+from time import perf_counter, process_time
+from typing import TYPE_CHECKING
+
+import click
+from bitroom import FetchScheduler, RoomAPI
+from bitroom.room import parse_bookings_data, week_dates
+from mock_server import MockServer
+
+if TYPE_CHECKING:
+    from typing import Iterable
+
+
+@dataclass
+class Result:
+    n_rooms: int
+    n_weeks: int
+    rooms_per_page: int
+    max_concurrency: int
+    n_bookings: int
+    n_requests: int
+    elapsed: float
+    """总用时，单位为秒（虚拟时钟，即模拟的网络用时）"""
+    first: float
+    """首批结果用时，单位为秒（同上）"""
+    throughput: float
+    """每秒获取的房间·周数（同上）"""
+    cpu: float
+    """CPU 用时，单位为秒"""
+    peak_memory: int
+    """内存峰值，单位为字节"""
+    parse_per_room_week: float
+    """解析每个房间·周的用时，单位为微秒"""
+
+
+class _VirtualClockLoop(asyncio.SelectorEventLoop):
+    """使用虚拟时钟的事件循环
+
+    没有就绪的回调时，时钟直接跳到最早的定时器，不真的等待；执行回调期间时钟不走。
+    模拟服务器没有真实 I/O，因此只有定时器（`asyncio.sleep`等）推动时间。
+    """
+
+    _now: float
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._now = 0.0
+
+    def time(self) -> float:
+        return self._now
+
+    def _run_once(self) -> None:
+        if not self._ready:  # type: ignore[attr-defined]
+            pending = [
+                h.when()
+                for h in self._scheduled  # type: ignore[attr-defined]
+                if not h.cancelled()
+            ]
+            if pending:
+                self._now = max(self._now, min(pending))
+        super()._run_once()  # type: ignore[misc]
+
+
+def _run_virtual(coro):
+    loop = _VirtualClockLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def _fetch(
+    server: MockServer, *, n_weeks: int, rooms_per_page: int, max_concurrency: int
+) -> tuple[int, float, float]:
+    """
+    :return: 时段数，首批结果用时，总用时（按事件循环的时钟）
+    """
+
+    now = asyncio.get_running_loop().time
+
+    async with server.client() as client:
+        api = await RoomAPI.login(
+            client,
+            "1120771210",
+            "cyberpunk",
+            scheduler=FetchScheduler(max_concurrency),
+        )
+        server.calls.clear()
+
+        n_bookings = 0
+        first = None
+        t_start = now()
+        async for bookings in api.iter_booking_pages(
+            datetime.date.today(), rooms_per_page=rooms_per_page, n_weeks=n_weeks
+        ):
+            if first is None:
+                first = now() - t_start
+            n_bookings += len(bookings)
+        elapsed = now() - t_start
+
+    return n_bookings, first or elapsed, elapsed
+
+
+def _parse_cost(server: MockServer, *, n_rooms: int, repeat: int = 3) -> float:
+    """解析每个房间·周的用时，单位为微秒"""
+
+    date = datetime.date.today()
+    data = server.site_info_data(date, 0, n_rooms)
+    dates = week_dates(date)
+
+    best = float("inf")
+    for _ in range(repeat):
+        t_start = perf_counter()
+        for _ in parse_bookings_data(data, dates=dates):
+            pass
+        best = min(best, perf_counter() - t_start)
+    return best / n_rooms * 1e6
+
+
+def bench(
+    *,
+    n_rooms: int,
+    n_weeks: int,
+    rooms_per_page: int,
+    max_concurrency: int,
+) -> Result:
+    def fetch(server: MockServer) -> tuple[int, float, float]:
+        return _run_virtual(
+            _fetch(
+                server,
+                n_weeks=n_weeks,
+                rooms_per_page=rooms_per_page,
+                max_concurrency=max_concurrency,
+            )
+        )
+
+    server = MockServer(n_rooms=n_rooms)
+    cpu_start = process_time()
+    n_bookings, first, elapsed = fetch(server)
+    cpu = process_time() - cpu_start
+
+    # 另跑一遍测量内存，tracemalloc 会拖慢上面的计时
+    tracemalloc.start()
+    fetch(MockServer(n_rooms=n_rooms))
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(
+        n_rooms=n_rooms,
+        n_weeks=n_weeks,
+        rooms_per_page=rooms_per_page,
+        max_concurrency=max_concurrency,
+        n_bookings=n_bookings,
+        n_requests=sum(server.calls.values()),
+        elapsed=elapsed,
+        first=first,
+        throughput=n_rooms * n_weeks / elapsed,
+        cpu=cpu,
+        peak_memory=peak_memory,
+        parse_per_room_week=_parse_cost(server, n_rooms=n_rooms),
+    )
+
+
+def _print_table(results: Iterable[Result]) -> None:
+    header = (
+        f"{'rooms':>5} {'weeks':>5} {'per page':>8} {'conc':>4} "
+        f"{'bookings':>8} {'requests':>8} {'total/s':>8} {'first/s':>8} "
+        f"{'rooms·weeks/s':>13} {'cpu/s':>6} {'peak/KiB':>8} {'parse/µs':>8}"
+    )
+    click.echo(header)
+    click.echo("-" * len(header))
+    for r in results:
+        click.echo(
+            f"{r.n_rooms:>5} {r.n_weeks:>5} {r.rooms_per_page:>8} "
+            f"{r.max_concurrency:>4} {r.n_bookings:>8} {r.n_requests:>8} "
+            f"{r.elapsed:>8.1f} {r.first:>8.1f} {r.throughput:>13.2f} "
+            f"{r.cpu:>6.2f} {r.peak_memory / 1024:>8.0f} {r.parse_per_room_week:>8.1f}"
+        )
+
+
+@click.command()
+@click.option("--rooms", "n_rooms", type=int, multiple=True, default=[50, 200])
+@click.option("--weeks", "n_weeks", type=int, multiple=True, default=[1, 2])
+@click.option(
+    "--rooms-per-page", type=int, multiple=True, default=[1, 3, 10], show_default=True
+)
+@click.option(
+    "--concurrency", "max_concurrency", type=int, multiple=True, default=[1, 4, 8]
+)
+@click.option("--json/--no-json", "as_json", default=False, help="按 JSON 行输出")
+def main(
+    n_rooms: list[int],
+    n_weeks: list[int],
+    rooms_per_page: list[int],
+    max_concurrency: list[int],
+    as_json: bool,
+) -> None:
+    """在模拟服务器上测量`fetch_bookings`"""
+
+    results = []
+    for rooms, weeks, per_page, concurrency in product(
+        n_rooms, n_weeks, rooms_per_page, max_concurrency
+    ):
+        result = bench(
+            n_rooms=rooms,
+            n_weeks=weeks,
+            rooms_per_page=per_page,
+            max_concurrency=concurrency,
+        )
+        if as_json:
+            click.echo(json.dumps(asdict(result)))
+        results.append(result)
+
+    if not as_json:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""导入用时的检查
+
+`bitroom --version`、`bitroom config-paths`等不访问网络的命令应当秒开，
+因此导入`bitroom`、`bitroom.cli`时不应导入 httpx、execjs、textual 等重依赖。
+
+在子进程中用`python -X importtime`测量，取多次中的最小值；
+超出预算或导入了重依赖时，以非零状态退出，可用于 CI。
+
+    $ python benchmarks/bench_import.py --budget 150
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import click
+
+_HEAVY = ["httpx", "execjs", "textual", "sqlite3", "asyncio"]
+"""不应在导入时导入的模块"""
+
+_MODULES = ["bitroom", "bitroom.cli"]
+"""要检查的模块"""
+
+
+def _import_time(module: str) -> float:
+    """导入`module`的累计用时，单位为毫秒"""
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    for line in reversed(stderr.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1000
+    raise ValueError(f"未找到 {module} 的导入用时")
+
+
+def _heavy_imports(module: str) -> list[str]:
+    """导入`module`时顺带导入的重依赖"""
+
+    stdout = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; "
+            f"print(*(m for m in {_HEAVY!r} if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return stdout.split()
+
+
+@click.command()
+@click.option(
+    "--budget",
+    type=float,
+    default=150,
+    show_default=True,
+    help="导入每个模块的预算，单位为毫秒",
+)
+@click.option("--repeat", type=int, default=5, show_default=True, help="测量次数")
+def main(budget: float, repeat: int) -> None:
+    """检查导入`bitroom`、`bitroom.cli`的用时与依赖"""
+
+    ok = True
+    for module in _MODULES:
+        elapsed = min(_import_time(module) for _ in range(repeat))
+        heavy = _heavy_imports(module)
+
+        status = "ok"
+        if heavy:
+            status = f"imports {', '.join(heavy)}"
+            ok = False
+        elif elapsed > budget:
+            status = "over budget"
+            ok = False
+        click.echo(f"{module:<12} {elapsed:>7.1f} ms / {budget:.0f} ms  {status}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""模拟 stu.bit.edu.cn 与统一身份认证
+
+不能对真实服务器压测，因此在本地模拟各接口，响应延迟随`pageSize`线性增长，同真实服务器。
+
+## 例子
+
+```
+server = MockServer(n_rooms=100, time_scale=0.01)
+async with server.client() as client:
+    api = await RoomAPI.login(client, "1120771210", "cyberpunk")
+```
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs
+
+from httpx import AsyncClient, MockTransport, Request, Response
+
+_SLOTS = [
+    "08:00-08:45",
+    "08:50-09:35",
+    "09:55-10:40",
+    "10:45-11:30",
+    "11:35-12:20",
+    "13:20-14:05",
+    "14:10-14:55",
+    "15:15-16:00",
+    "16:05-16:50",
+    "16:55-17:40",
+    "18:30-19:15",
+    "19:20-20:05",
+    "20:10-20:55",
+]
+"""一天中的各个时段"""
+
+
+@dataclass
+class MockServer:
+    """模拟的服务器"""
+
+    n_rooms: int = 100
+    """房间总数"""
+    base_latency: float = 1.0
+    """每个请求的固定延迟，单位为秒（未缩放）"""
+    latency_per_room: float = 1.0
+    """`getSiteInfo.do`每页每个房间的延迟，单位为秒（未缩放）"""
+    time_scale: float = 1.0
+    """所有延迟乘以此系数，以便快速运行"""
+    free_ratio: float = 0.5
+    """时段可预约的比例"""
+    seed: int = 0
+    calls: Counter[str] = field(default_factory=Counter)
+    """各接口的请求次数"""
+
+    async def _sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds * self.time_scale)
+
+    def site_info(self, room: int, monday: datetime.date) -> dict:
+        """某房间某周的`siteInfoList`项"""
+
+        rng = random.Random(f"{self.seed}-{room}-{monday}")
+        return {
+            "CDDM": f"{room:04d}",  # 场地代码
+            "CDMC": f"【模拟书院】{room}号房间",  # 场地名称
+            "totalCount": str(self.n_rooms),
+            "currentWeekData": [
+                {
+                    "XQJ": d + 1,  # 星期几
+                    "isLock": False,
+                    "applyTime": ",".join(
+                        s for s in _SLOTS if rng.random() < self.free_ratio
+                    ),
+                }
+                for d in range(7)
+            ],
+        }
+
+    def site_info_data(
+        self, date: datetime.date, page: int, rooms_per_page: int
+    ) -> dict:
+        """`getSiteInfo.do`响应中的`data`
+
+        :param page: 第几页，从0开始
+        """
+
+        monday = date - datetime.timedelta(days=date.weekday())
+        rooms = range(
+            page * rooms_per_page, min((page + 1) * rooms_per_page, self.n_rooms)
+        )
+        return {
+            "siteInfoList": [self.site_info(r, monday) for r in rooms],
+            "weekList": [
+                {"WEEKDATE": (monday + datetime.timedelta(days=d)).isoformat()}
+                for d in range(7)
+            ],
+        }
+
+    async def handle(self, request: Request) -> Response:
+        path = request.url.path
+        self.calls[path.rsplit("/", 1)[-1]] += 1
+        await self._sleep(self.base_latency)
+
+        if request.url.host == "login.bit.edu.cn":
+            if request.method == "GET":
+                return Response(
+                    200,
+                    text='<input id="pwdEncryptSalt" value="0123456789abcdef">'
+                    '<input name="execution" value="e1s1">',
+                )
+            # 登录成功会重定向
+            return Response(302, headers={"Location": "http://stu.bit.edu.cn/"})
+
+        form = parse_qs(request.content.decode())
+
+        if path.endswith("getAppConfig.do"):
+            return Response(200, json={})
+
+        if path.endswith("getSiteInfo.do"):
+            query = json.loads(form["data"][0])
+            rooms_per_page = query["pageSize"]
+            await self._sleep(self.latency_per_room * rooms_per_page)
+            data = self.site_info_data(
+                datetime.date.fromisoformat(query["YYRQ"]),
+                query["pageNumber"] - 1,
+                rooms_per_page,
+            )
+            return Response(200, json={"code": "0", "msg": "成功", "data": data})
+
+        if path.endswith("saveReserveSite.do"):
+            return Response(200, json={"code": "0", "msg": "成功"})
+
+        if path.endswith("cdsyqkcx.do"):
+            rows = [
+                {
+                    "SYRQ": f"{form['YYRQ'][0]} {slot}",  # 使用日期
+                    "SQRXM": "Boltzmann",  # 申请人姓名
+                    "LXDH": "13806491023",  # 联系电话
+                    "SQCS": "模拟",  # 申请陈述
+                }
+                for slot in _SLOTS[:2]
+            ]
+            return Response(
+                200, json={"code": "0", "data" "s": {"cdsyqkcx": {"rows": rows}}}
+            )
+
+        return Response(404)
+
+    def client(self) -> AsyncClient:
+        """连接到此服务器的 client"""
+        return AsyncClient(transport=MockTransport(self.handle))
@@ -1,4 +1,54 @@
-from .auth import auth
-from .room import Booking, RoomAPI
+"""BIT 场地预约查询接口
 
-__all__ = ["auth", "Booking", "RoomAPI"]
+除轻量的`auth`外，各名称在首次访问时才导入对应模块，
+以免`bitroom --version`等也要导入 httpx 等。
+"""
+
+from __future__ import annotations
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# 与子包`bitroom.auth`同名，须先导入，否则导入子包后会被覆盖
+from .auth import SessionStore, auth
+
+if TYPE_CHECKING:
+    from .cache import BookingCache
+    from .catalog import RoomCatalog
+    from .room import Booking, RoomAPI
+    from .scheduler import FetchScheduler
+    from .table import BookingTable
+
+_EXPORTS = {
+    "Booking": ".room",
+    "BookingCache": ".cache",
+    "BookingTable": ".table",
+    "FetchScheduler": ".scheduler",
+    "RoomAPI": ".room",
+    "RoomCatalog": ".catalog",
+}
+"""名称 → 所在模块"""
+
+__all__ = [
+    "auth",
+    "Booking",
+    "BookingCache",
+    "BookingTable",
+    "FetchScheduler",
+    "RoomAPI",
+    "RoomCatalog",
+    "SessionStore",
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # 下次直接访问
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,3 +1,4 @@
 from .auth import auth
+from .session import SessionStore
 
-__all__ = ["auth"]
+__all__ = ["auth", "SessionStore"]
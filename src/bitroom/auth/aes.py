@@ -0,0 +1,143 @@
+"""AES-CBC 加密
+
+纯 Python 实现，只含加密，仅供登录时加密密码使用，不追求速度。
+"""
+
+from __future__ import annotations
+
+
+def _xtime(a: int) -> int:
+    """GF(2⁸) 中乘 2"""
+    a <<= 1
+    return a ^ 0x11B if a & 0x100 else a
+
+
+def _mul(a: int, b: int) -> int:
+    """GF(2⁸) 中的乘法"""
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a = _xtime(a)
+        b >>= 1
+    return result
+
+
+def _make_sbox() -> bytes:
+    # 3 是 GF(2⁸) 乘法群的生成元，由指数、对数表求逆元，免去逐个试乘
+    exp = [1] * 255
+    for i in range(1, 255):
+        exp[i] = _mul(exp[i - 1], 3)
+    log = {a: i for i, a in enumerate(exp)}
+
+    sbox = bytearray(256)
+    for x in range(256):
+        # 乘法逆元（0 的逆元约定为 0）
+        inv = exp[-log[x] % 255] if x else 0
+        # 仿射变换
+        s = inv
+        for shift in range(1, 5):
+            s ^= ((inv << shift) | (inv >> (8 - shift))) & 0xFF
+        sbox[x] = s ^ 0x63
+    return bytes(sbox)
+
+
+_SBOX = _make_sbox()
+_MUL2 = bytes(_xtime(x) for x in range(256))
+_MUL3 = bytes(_xtime(x) ^ x for x in range(256))
+
+
+def _expand_key(key: bytes) -> list[bytes]:
+    """密钥扩展
+
+    :return: 每轮的轮密钥，各 16 字节
+    """
+
+    assert len(key) in (16, 24, 32), f"AES 密钥长度应为 16、24 或 32 字节：{len(key)}"
+
+    nk = len(key) // 4
+    n_rounds = nk + 6
+    words = [list(key[4 * i : 4 * i + 4]) for i in range(nk)]
+
+    rcon = 1
+    for i in range(nk, 4 * (n_rounds + 1)):
+        w = list(words[i - 1])
+        if i % nk == 0:
+            w = [_SBOX[b] for b in w[1:] + w[:1]]
+            w[0] ^= rcon
+            rcon = _xtime(rcon)
+        elif nk > 6 and i % nk == 4:
+            w = [_SBOX[b] for b in w]
+        words.append([a ^ b for a, b in zip(words[i - nk], w)])
+
+    return [bytes(sum(words[4 * r : 4 * r + 4], [])) for r in range(n_rounds + 1)]
+
+
+def _encrypt_block(block: bytes, round_keys: list[bytes]) -> bytes:
+    """加密一块（16 字节）
+
+    # 例子
+
+    FIPS-197 附录 C.1：
+
+    ```
+    key = bytes(range(16))
+    plain = bytes.fromhex("00112233445566778899aabbccddeeff")
+    assert (
+        _encrypt_block(plain, _expand_key(key)).hex()
+        == "69c4e0d86a7b0430d8cdb78070b4c55a"
+    )
+    ```
+    """
+
+    # state[4 * c + r]：第 c 列、第 r 行
+    state = [a ^ b for a, b in zip(block, round_keys[0])]
+
+    for n, round_key in enumerate(round_keys[1:], start=1):
+        # SubBytes + ShiftRows
+        state = [
+            _SBOX[state[(4 * (c + r) + r) % 16]] for c in range(4) for r in range(4)
+        ]
+
+        # MixColumns（最后一轮没有）
+        if n < len(round_keys) - 1:
+            mixed = []
+            for c in range(4):
+                a0, a1, a2, a3 = state[4 * c : 4 * c + 4]
+                mixed += [
+                    _MUL2[a0] ^ _MUL3[a1] ^ a2 ^ a3,
+                    a0 ^ _MUL2[a1] ^ _MUL3[a2] ^ a3,
+                    a0 ^ a1 ^ _MUL2[a2] ^ _MUL3[a3],
+                    _MUL3[a0] ^ a1 ^ a2 ^ _MUL2[a3],
+                ]
+            state = mixed
+
+        # AddRoundKey
+        state = [a ^ b for a, b in zip(state, round_key)]
+
+    return bytes(state)
+
+
+def encrypt_cbc(plain: bytes, key: bytes, iv: bytes) -> bytes:
+    """AES-CBC 加密，PKCS#7 填充
+
+    :param plain: 明文
+    :param key: 密钥，16、24 或 32 字节
+    :param iv: 初始向量，16 字节
+    :return: 密文
+    """
+
+    assert len(iv) == 16, f"初始向量应为 16 字节：{len(iv)}"
+
+    round_keys = _expand_key(key)
+
+    n_pad = 16 - len(plain) % 16
+    plain += bytes([n_pad] * n_pad)
+
+    cipher = bytearray()
+    previous = iv
+    for i in range(0, len(plain), 16):
+        block = bytes(a ^ b for a, b in zip(plain[i : i + 16], previous))
+        previous = _encrypt_block(block, round_keys)
+        cipher += previous
+    return bytes(cipher)
@@ -6,20 +6,67 @@ https://github.com/YoungKlaus/BIT_Auto_Leave/blob/895c0bdc7a9d111bdf4230e4e4102e
 from __future__ import annotations
 
 import re
+from base64 import b64encode
+from secrets import choice
 from typing import TYPE_CHECKING
 
-from execjs import compile
-
-from .encrypt_js import encrypt_js
+from .aes import encrypt_cbc
 
 if TYPE_CHECKING:
+    from typing import Literal
+
     from httpx import AsyncClient
 
+_AES_CHARS = "ABCDEFGHJKMNPQRSTWXYZabcdefhijkmnprstwxyz2345678"
+"""`randomString`所用字符"""
+
+
+def _random_string(length: int) -> str:
+    return "".join(choice(_AES_CHARS) for _ in range(length))
+
+
+def _encrypt_aes(data: str, key: str, iv: str) -> str:
+    """`getAesString`的 Python 实现
+
+    # 例子
+
+    与 JS 版本的结果一致：
+
+    ```
+    assert (
+        _encrypt_aes("hello", key="0123456789abcdef", iv="fedcba9876543210")
+        == "e+3OsGVfOJQQaXifNkYgkQ=="
+    )
+    ```
+    """
+
+    cipher = encrypt_cbc(
+        data.encode("utf-8"), key=key.strip().encode("utf-8"), iv=iv.encode("utf-8")
+    )
+    return b64encode(cipher).decode("ascii")
+
+
+def encrypt(
+    password: str, salt: str, *, backend: Literal["python", "js"] = "python"
+) -> str:
+    """给密码加盐
+
+    :param backend: 实现方式；`"js"`会调用原始 JS 代码，需要安装 PyExecJS 和 JS 运行时
+
+    前缀 64 个随机字符后，以盐为密钥、16 个随机字符为初始向量，AES-CBC 加密。
+    """
+
+    if backend == "js":
+        from execjs import compile
+
+        from .encrypt_js import encrypt_js
+
+        context = compile(encrypt_js)
+        return context.call("encryptPassword", password, salt)
 
-def encrypt(password: str, salt: str) -> str:
-    """给密码加盐"""
-    context = compile(encrypt_js)
-    return context.call("encryptPassword", password, salt)
+    if not salt:
+        return password
+    return _encrypt_aes(_random_string(64) + password, key=salt, iv=_random_string(16))
 
 
 async def auth(client: AsyncClient, username: str, password: str) -> None:
@@ -44,7 +91,6 @@ async def auth(client: AsyncClient, username: str, password: str) -> None:
         # ruff: noqa: E501
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
         "Accept-Language": "zh-CN,zh;q=0.9",
-        "Proxy-Connection": "keep-alive",
         "Upgrade-Insecure-Requests": "1",
         # ruff: noqa: E501
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.198 Safari/537.36",
@@ -0,0 +1,110 @@
+"""保存登录状态
+
+把 cookie 与请求头保存到本地，下次直接恢复，免去重新登录。
+"""
+
+from __future__ import annotations
+
+import os
+from json import dumps, loads
+from logging import getLogger
+from time import time
+from typing import TYPE_CHECKING
+
+from ..config import cache_dir
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from httpx import AsyncClient
+
+_logger = getLogger(__name__)
+
+
+class SessionStore:
+    """登录状态的存储
+
+    文件只有当前用户可读写。恢复的状态可能已过期，使用前请验证。
+
+    ## 例子
+
+    ```
+    store = SessionStore()
+    if not store.load(client, username):
+        await auth(client, username, password)
+        store.save(client, username)
+    ```
+    """
+
+    path: Path
+
+    def __init__(self, path: Path | None = None) -> None:
+        """
+        :param path: 存储文件，默认在缓存目录中
+        """
+
+        self.path = path or cache_dir() / "session.json"
+
+    def load(self, client: AsyncClient, username: str) -> bool:
+        """恢复登录状态到`client`
+
+        :param username: 学号，须与保存时一致
+        :return: 是否恢复了
+
+        文件不合法（如写了一半、格式不对）时视同不存在，记录警告，不修改`client`。
+        """
+
+        try:
+            raw = loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as error:
+            _logger.warning("Ignored unreadable session file %s: %r", self.path, error)
+            return False
+
+        try:
+            if raw.get("username") != username:
+                return False
+            cookies = [
+                (c["name"], c["value"], c["domain"], c["path"]) for c in raw["cookies"]
+            ]
+            headers = dict(raw["headers"])
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            _logger.warning("Ignored malformed session file %s: %r", self.path, error)
+            return False
+
+        for name, value, domain, path in cookies:
+            client.cookies.set(name, value, domain=domain, path=path)
+        client.headers.update(headers)
+        return True
+
+    def save(self, client: AsyncClient, username: str) -> None:
+        """保存`client`的登录状态
+
+        :param username: 学号
+        """
+
+        raw = {
+            "username": username,
+            "saved_at": time(),
+            "cookies": [
+                {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+                for c in client.cookies.jar
+            ],
+            "headers": dict(client.headers),
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 先以 0o600 创建，避免短暂地对其他用户可读
+        with open(
+            self.path,
+            "w",
+            encoding="utf-8",
+            opener=lambda path, flags: os.open(path, flags, 0o600),
+        ) as f:
+            f.write(dumps(raw))
+        os.chmod(self.path, 0o600)
+
+    def clear(self) -> None:
+        """删除保存的登录状态"""
+        self.path.unlink(missing_ok=True)
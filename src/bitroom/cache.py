@@ -0,0 +1,188 @@
+"""可预约时空区间的本地缓存
+
+以（房间, 周）为单位，在 SQLite 中保存`getSiteInfo.do`返回的原始数据及获取时刻。
+"""
+
+from __future__ import annotations
+
+import datetime
+import sqlite3
+from json import dumps, loads
+from time import time
+from typing import TYPE_CHECKING
+
+from .config import cache_dir
+from .room import parse_bookings_data, week_dates
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .room import Booking
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id TEXT NOT NULL,
+    week TEXT NOT NULL,  -- 周一的日期
+    room_name TEXT NOT NULL,
+    data TEXT NOT NULL,  -- siteInfoList 中的一项，JSON
+    fetched_at REAL NOT NULL,  -- Unix 时间戳
+    PRIMARY KEY (room_id, week)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    week TEXT NOT NULL,
+    rooms_per_page INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    room_ids TEXT NOT NULL,  -- JSON
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (week, rooms_per_page, page)
+);
+"""
+
+
+class BookingCache:
+    """可预约时空区间的本地缓存
+
+    获取时刻在`ttl`秒内的数据视为新鲜，可直接使用；否则需重新获取。
+
+    ## 例子
+
+    ```
+    with BookingCache() as cache:
+        api = await RoomAPI.build(client, cache=cache)
+        bookings = await api.fetch_bookings(date.today())  # 只请求过期的页
+    ```
+    """
+
+    ttl: float
+    """有效期，单位为秒"""
+    _db: sqlite3.Connection
+
+    def __init__(self, path: Path | None = None, *, ttl: float = 600) -> None:
+        """
+        :param path: 数据库文件，默认在缓存目录中
+        :param ttl: 有效期，单位为秒
+        """
+
+        if path is None:
+            path = self.default_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.ttl = ttl
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def default_path() -> Path:
+        return cache_dir() / "bookings.sqlite3"
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> BookingCache:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get_page(
+        self, week: datetime.date, page: int, *, rooms_per_page: int
+    ) -> list[dict] | None:
+        """读取新鲜的一页
+
+        :param week: 周一的日期
+        :param page: 第几页，从0开始
+        :param rooms_per_page: 每页房间数量
+        :return: 该页`siteInfoList`；若未缓存或已过期，则为`None`
+        """
+
+        row = self._db.execute(
+            "SELECT room_ids FROM pages"
+            " WHERE week = ? AND rooms_per_page = ? AND page = ?",
+            (week.isoformat(), rooms_per_page, page),
+        ).fetchone()
+        if row is None:
+            return None
+
+        room_ids: list[str] = loads(row[0])
+        rows = dict(
+            self._db.execute(
+                "SELECT room_id, data FROM rooms"
+                " WHERE week = ? AND fetched_at >= ?"
+                f" AND room_id IN ({', '.join('?' * len(room_ids))})",
+                (week.isoformat(), time() - self.ttl, *room_ids),
+            ).fetchall()
+        )
+        if len(rows) < len(room_ids):
+            return None
+
+        return [loads(rows[r]) for r in room_ids]
+
+    def put_page(
+        self,
+        week: datetime.date,
+        page: int,
+        rooms: list[dict],
+        *,
+        rooms_per_page: int,
+        fetched_at: float | None = None,
+    ) -> None:
+        """保存一页
+
+        :param week: 周一的日期
+        :param page: 第几页，从0开始
+        :param rooms: 该页`siteInfoList`
+        :param rooms_per_page: 每页房间数量
+        :param fetched_at: 获取时刻，默认为现在
+        """
+
+        fetched_at = fetched_at or time()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        r["CDDM"],  # 场地代码
+                        week.isoformat(),
+                        r["CDMC"],  # 场地名称
+                        dumps(r, ensure_ascii=False),
+                        fetched_at,
+                    )
+                    for r in rooms
+                ),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (
+                    week.isoformat(),
+                    rooms_per_page,
+                    page,
+                    dumps([r["CDDM"] for r in rooms]),
+                    fetched_at,
+                ),
+            )
+
+    def room_names(self) -> dict[str, str]:
+        """缓存中所有房间的编号到名称"""
+        return dict(self._db.execute("SELECT room_id, room_name FROM rooms"))
+
+    def snapshot(self, since: datetime.date | None = None) -> list[Booking]:
+        """读取所有缓存，无论是否过期
+
+        :param since: 只读取这一天所在周及以后，默认为今天
+        """
+
+        since = since or datetime.date.today()
+        monday = since - datetime.timedelta(days=since.weekday())
+
+        bookings = []
+        for week, data in self._db.execute(
+            "SELECT week, data FROM rooms WHERE week >= ? ORDER BY week, room_id",
+            (monday.isoformat(),),
+        ):
+            bookings.extend(
+                parse_bookings_data(
+                    {"siteInfoList": [loads(data)]},
+                    dates=week_dates(datetime.date.fromisoformat(week)),
+                )
+            )
+        return bookings
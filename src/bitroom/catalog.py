@@ -0,0 +1,144 @@
+"""房间目录
+
+`getSiteInfo.do`的结果含有房间编号与名称，而其它接口（如`cdsyqkcx.do`）只有编号。
+这里收集前者，供后者查询名称。
+
+房间列表极少变化，因此连同房间总数保存到本地，爬取时无需再先试探一次。
+"""
+
+from __future__ import annotations
+
+from json import dumps, loads
+from time import time
+from typing import TYPE_CHECKING
+
+from .config import cache_dir
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Iterable
+
+
+class RoomCatalog:
+    """房间目录
+
+    ## 例子
+
+    ```
+    catalog = RoomCatalog()
+    catalog.update(data["siteInfoList"])
+    catalog.name("5")  # => "【睿信书院】静c-鸿远报告厅"
+    ```
+
+    持久化：
+
+    ```
+    catalog = RoomCatalog.load()
+    api = await RoomAPI.build(client, catalog=catalog)  # 目录新鲜则不再试探
+    ```
+    """
+
+    names: dict[str, str]
+    """房间编号到名称"""
+    rooms: dict[str, dict]
+    """房间编号到`siteInfoList`中的其它信息（不含各周的预约情况）"""
+    total_count: int | None
+    """房间总数，未知则为`None`"""
+    checked_at: float | None
+    """上次确认`total_count`的时刻（Unix 时间戳）"""
+    max_age: float
+    """`total_count`的有效期，单位为秒"""
+    path: Path | None
+    """保存位置；`None`表示只在内存中"""
+
+    def __init__(
+        self,
+        names: dict[str, str] | None = None,
+        *,
+        max_age: float = 24 * 3600,
+        path: Path | None = None,
+    ) -> None:
+        self.names = dict(names or {})
+        self.rooms = {}
+        self.total_count = None
+        self.checked_at = None
+        self.max_age = max_age
+        self.path = path
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self.names
+
+    def update(self, site_info_list: Iterable[dict]) -> None:
+        """从`getSiteInfo.do`的`siteInfoList`收集
+
+        每项都带有房间总数，顺便更新`total_count`。
+        """
+        for room in site_info_list:
+            self.names[room["CDDM"]] = room["CDMC"]  # 场地代码、场地名称
+            self.rooms[room["CDDM"]] = {
+                k: v for k, v in room.items() if k != "currentWeekData"
+            }
+            if "totalCount" in room:
+                self.total_count = int(room["totalCount"])
+                self.checked_at = time()
+
+    def name(self, room_id: str, default: str = "<unknown>") -> str:
+        """查询名称，未收录则返回`default`"""
+        return self.names.get(room_id, default)
+
+    def is_fresh(self) -> bool:
+        """`total_count`是否已知且未过期"""
+        return (
+            self.total_count is not None
+            and self.checked_at is not None
+            and time() - self.checked_at < self.max_age
+        )
+
+    @staticmethod
+    def default_path() -> Path:
+        return cache_dir() / "rooms.json"
+
+    @classmethod
+    def load(
+        cls, path: Path | None = None, *, max_age: float = 24 * 3600
+    ) -> RoomCatalog:
+        """读取之前保存的目录
+
+        文件不存在或不合法，则从空目录开始。之后`save`仍写入`path`。
+
+        :param max_age: `total_count`的有效期，单位为秒；过期后爬取时重新试探
+        """
+
+        path = path or cls.default_path()
+        catalog = RoomCatalog(max_age=max_age, path=path)
+        try:
+            raw = loads(path.read_text(encoding="utf-8"))
+            catalog.rooms = dict(raw["rooms"])
+            catalog.names = {r: room["CDMC"] for r, room in catalog.rooms.items()}
+            catalog.total_count = raw["total_count"]
+            catalog.checked_at = raw["checked_at"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return RoomCatalog(max_age=max_age, path=path)
+        return catalog
+
+    def save(self) -> None:
+        """保存到`path`；若`path`为`None`，则什么也不做"""
+
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            dumps(
+                {
+                    "rooms": self.rooms,
+                    "total_count": self.total_count,
+                    "checked_at": self.checked_at,
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
@@ -1,15 +1,30 @@
-from asyncio import run
-from datetime import date
-from json import dumps, load
+from __future__ import annotations
+
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from functools import partial
+from json import dumps
+from pathlib import Path
 from sys import exit, stdin
+from typing import TYPE_CHECKING, Literal
 
 import click
-from httpx import AsyncClient
 
-from . import Booking, RoomAPI, auth
 from .config import Config, read_config
 from .config import config_paths as _config_paths
 
+# 除 click 与配置外，各模块在命令用到时才导入，以免`bitroom --version`等导入 httpx 等
+if TYPE_CHECKING:
+    from typing import Callable, Iterable
+
+    from httpx import AsyncClient
+
+    from . import Booking, RoomAPI
+    from .cache import BookingCache
+    from .trace import Tracer
+
+    OutputFormat = Literal["text", "json", "jsonl", "compact", "binary"]
+
 
 @click.group()
 @click.version_option()
@@ -24,33 +39,92 @@ def config_paths() -> None:
     click.echo("\n".join(map(str, _config_paths())))
 
 
-async def _show(config: Config) -> list[Booking]:
-    async with AsyncClient() as client:
-        await auth(client, config.username, config.password)
-        api = await RoomAPI.build(client)
+def _parse_rooms_per_page(
+    ctx: click.Context, param: click.Parameter, value: str
+) -> int | Literal["auto"]:
+    if value == "auto":
+        return value
+    if value.isdecimal() and int(value) >= 1:
+        return int(value)
+    raise click.BadParameter("应为正整数或“auto”")
 
-        return await api.fetch_bookings(date.today())
 
+def _crawl_options(f: Callable) -> Callable:
+    """访问 API 相关的选项"""
 
-@cli.command()
-@click.option("--json/--no-json", default=False, help="按 JSON 格式输出")
-@click.option(
-    "--auth",
-    type=str,
-    help="认证信息，形如“1120771210:cyberpunk”（<学号>:<密码>）；不建议使用，请改用配置文件",
-)
-def show(json: bool, auth: str | None) -> None:
-    """显示所有可预约的时空区间
+    options = [
+        click.option(
+            "--auth",
+            type=str,
+            help="认证信息，形如“1120771210:cyberpunk”（<学号>:<密码>）；不建议使用，请改用配置文件",
+        ),
+        click.option(
+            "--rooms-per-page",
+            default="3",
+            show_default=True,
+            callback=_parse_rooms_per_page,
+            help="访问 API 时每页房间数量；“auto”表示根据之前的测量结果自动调节",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
 
-    默认从 API 爬取，因服务器响应慢，大约需 10 s。
 
-        $ bitroom show
+def _fetch_options(f: Callable) -> Callable:
+    """爬取相关的选项"""
 
-    也可直接从 stdin 提供之前的结果。
+    options = [
+        _crawl_options,
+        click.option(
+            "--cache/--no-cache",
+            default=True,
+            help="使用本地缓存，只请求过期的数据，房间目录新鲜时不再试探",
+        ),
+        click.option(
+            "--ttl",
+            type=click.FloatRange(min=0),
+            default=600,
+            show_default=True,
+            help="缓存有效期，单位为秒",
+        ),
+        click.option(
+            "--daemon/--no-daemon",
+            default=True,
+            help="若 bitroom serve 在运行，直接向它查询，不再爬取",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
 
-    \b
-        $ bitroom show --json > ./bookings.json
-        $ cat ./bookings.json | bitroom show
+
+def _merge_options(*, default: bool) -> Callable[[Callable], Callable]:
+    """合并相邻时段相关的选项"""
+
+    def decorator(f: Callable) -> Callable:
+        f = click.option(
+            "--gap",
+            type=click.IntRange(min=0),
+            default=10,
+            show_default=True,
+            help="合并时允许的最大间隔，单位为分钟",
+        )(f)
+        f = click.option(
+            "--merge/--no-merge",
+            default=default,
+            show_default=True,
+            help="合并同一房间、同一天相邻的时段",
+        )(f)
+        return f
+
+    return decorator
+
+
+def _resolve_config(auth: str | None) -> Config:
+    """读取配置，并用`--auth`覆盖
+
+    无法认证则退出。
     """
 
     config = read_config()
@@ -68,22 +142,616 @@ def show(json: bool, auth: str | None) -> None:
             config.username = username
             config.password = password
 
-    # If stdin is empty, fetch bookings from API.
-    # Otherwise, take stdin.
-    if stdin.isatty():
-        if config is None:
-            click.echo(
-                f"{click.style('[Error]', fg='red')} "
-                "未提供学号、密码，将无法认证。请填写配置文件。"
-                "可用 bitroom config-paths 查看文件位置。"
+    if config is None:
+        click.echo(
+            f"{click.style('[Error]', fg='red')} "
+            "未提供学号、密码，将无法认证。请填写配置文件。"
+            "可用 bitroom config-paths 查看文件位置。"
+        )
+        exit(1)
+
+    return config
+
+
+async def _login(
+    client: AsyncClient,
+    config: Config,
+    *,
+    cache: BookingCache | None,
+    catalog: bool | None = None,
+    tracer: Tracer | None = None,
+) -> RoomAPI:
+    """
+    :param catalog: 是否使用保存的房间目录；默认同`cache`
+    :param tracer: 记录各请求、解析的用时等
+    """
+
+    from . import RoomAPI, RoomCatalog, SessionStore
+
+    if catalog is None:
+        catalog = cache is not None
+    return await RoomAPI.login(
+        client,
+        config.username,
+        config.password,
+        session=SessionStore(),
+        cache=cache,
+        catalog=RoomCatalog.load() if catalog else None,
+        page_timeout=config.http.page_timeout,
+        tracer=tracer,
+    )
+
+
+async def _show(
+    config: Config,
+    *,
+    format: OutputFormat,
+    gap: timedelta | None,
+    rooms_per_page: int | Literal["auto"],
+    cache: BookingCache | None,
+    tracer: Tracer | None = None,
+) -> None:
+    """爬取并输出
+
+    按`text`、`jsonl`格式输出时，每获取一页就输出一页，
+    以便`bitroom show | fzf`尽早显示结果。
+
+    :param gap: 合并相邻时段时允许的最大间隔；`None`表示不合并
+    :param tracer: 记录各请求、解析的用时等
+    """
+
+    from .client import build_client
+    from .room import coalesce
+
+    async with build_client(config.http) as client:
+        api = await _login(client, config, cache=cache, tracer=tracer)
+
+        if format in ("text", "jsonl"):
+            async for bookings in api.iter_booking_pages(
+                date.today(), rooms_per_page=rooms_per_page
+            ):
+                # 每页包含若干房间完整的一周，可以分页合并
+                if gap is not None:
+                    bookings = coalesce(bookings, gap=gap)
+                if bookings:
+                    _echo_bookings(bookings, format=format)
+        else:
+            bookings = await api.fetch_bookings(
+                date.today(), rooms_per_page=rooms_per_page
             )
-            exit(1)
+            if gap is not None:
+                bookings = coalesce(bookings, gap=gap)
+            _echo_bookings(bookings, format=format)
+
+
+def _ask_daemon(path: str, params: dict[str, str]) -> list[Booking] | None:
+    """向本地服务`bitroom serve`查询
+
+    :return: 结果；若服务未运行、尚未就绪、不能回答，返回`None`
+    """
 
-        bookings = run(_show(config))
+    from asyncio import run
+
+    from . import snapshot
+    from .config import ServeConfig
+    from .serve import request
+
+    config = read_config()
+    body = run(
+        request(config.serve if config is not None else ServeConfig(), path, params)
+    )
+    return snapshot.load(body) if body is not None else None
+
+
+def _read_stdin() -> list[Booking]:
+    """读取之前的结果，自动识别格式"""
+    from . import snapshot
+
+    return snapshot.load(click.get_binary_stream("stdin").read())
+
+
+def _echo_bookings(bookings: Iterable[Booking], *, format: OutputFormat) -> None:
+    from . import snapshot
+
+    if format == "text":
+        click.echo("\n".join(map(str, bookings)))
+    elif format == "jsonl":
+        click.echo("\n".join(snapshot.iter_jsonl(bookings)))
     else:
-        bookings = map(Booking.from_dict, load(stdin))
+        stdout = click.get_binary_stream("stdout")
+        stdout.write(snapshot.dump(bookings, format))
+        if format != "binary":
+            stdout.write(b"\n")
+        stdout.flush()
+
+
+def _format_options(f: Callable) -> Callable:
+    """输出格式相关的选项"""
+
+    f = click.option(
+        "--json/--no-json",
+        default=False,
+        help="按 JSON 格式输出，同 --format json",
+    )(f)
+    f = click.option(
+        "--format",
+        type=click.Choice(["text", "json", "jsonl", "compact", "binary"]),
+        default="text",
+        show_default=True,
+        help="输出格式；jsonl 每行一项，compact、binary 更紧凑，读写更快",
+    )(f)
+    return f
+
+
+@cli.command()
+@_format_options
+@_merge_options(default=False)
+@_fetch_options
+@click.option(
+    "--trace",
+    "trace_path",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="记录各请求、解析的用时等，按 JSON 保存到此文件，并在 stderr 输出汇总",
+)
+def show(
+    format: OutputFormat,
+    json: bool,
+    merge: bool,
+    gap: int,
+    auth: str | None,
+    rooms_per_page: int | Literal["auto"],
+    cache: bool,
+    ttl: float,
+    daemon: bool,
+    trace_path: Path | None,
+) -> None:
+    """显示所有可预约的时空区间
+
+    默认从 API 爬取，因服务器响应慢，大约需 10 s。
+
+    按 text、jsonl 格式输出时，每获取一页就输出一页。
+
+    爬取结果会缓存到本地，有效期内再次运行只请求过期的部分。
+
+    若 bitroom serve 在运行，则直接向它查询（--trace 除外）。
+
+        $ bitroom show
+
+    也可直接从 stdin 提供之前的结果，任何格式均可。
+
+    \b
+        $ bitroom show --json > ./bookings.json
+        $ cat ./bookings.json | bitroom show
+    """
+
+    from asyncio import run
+
+    from .cache import BookingCache
+    from .room import coalesce
+    from .trace import Tracer
 
     if json:
-        click.echo(dumps([b.as_dict() for b in bookings]))
+        format = "json"
+    max_gap = timedelta(minutes=gap) if merge else None
+
+    bookings: list[Booking] | None = None
+    if not stdin.isatty():
+        bookings = _read_stdin()
+    elif daemon and trace_path is None:
+        # 同`_show`，获取本周和下周
+        monday = date.today() - timedelta(days=date.today().weekday())
+        bookings = _ask_daemon(
+            "/bookings",
+            {
+                "format": "binary",
+                "until": (monday + timedelta(weeks=2, days=-1)).isoformat(),
+            },
+        )
+
+    if bookings is None:
+        config = _resolve_config(auth)
+        tracer = Tracer() if trace_path is not None else None
+        with BookingCache(ttl=ttl) if cache else nullcontext() as booking_cache:
+            try:
+                run(
+                    _show(
+                        config,
+                        format=format,
+                        gap=max_gap,
+                        rooms_per_page=rooms_per_page,
+                        cache=booking_cache,
+                        tracer=tracer,
+                    )
+                )
+            finally:
+                if tracer is not None and trace_path is not None:
+                    tracer.dump(trace_path)
+                    click.echo(tracer.summary(), err=True)
     else:
-        click.echo("\n".join(map(str, bookings)))
+        if max_gap is not None:
+            bookings = coalesce(bookings, gap=max_gap)
+        _echo_bookings(bookings, format=format)
+
+
+_DATETIME_FORMATS = ["%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"]
+
+
+@cli.command()
+@click.option(
+    "--from",
+    "t_start",
+    type=click.DateTime(_DATETIME_FORMATS),
+    default=lambda: datetime.now().replace(second=0, microsecond=0),
+    help="开始时刻，形如“2023-05-07 14:00”，默认为现在",
+)
+@click.option(
+    "--to",
+    "t_end",
+    type=click.DateTime(_DATETIME_FORMATS),
+    help="结束时刻，形如“2023-05-07 18:00”",
+)
+@click.option(
+    "--cover/--overlap",
+    default=False,
+    help="只显示完整包含 [--from, --to) 的区间，而非有重叠即可",
+)
+@click.option(
+    "--duration",
+    type=click.IntRange(min=1),
+    help="所需时长，单位为分钟；不提供 --to 时，显示 --from 以后最早能容纳它的区间",
+)
+@click.option(
+    "--weeks",
+    "n_weeks",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="不提供 --to 时，最多往后查找几周",
+)
+@_format_options
+@_merge_options(default=True)
+@_fetch_options
+def find(
+    t_start: datetime,
+    t_end: datetime | None,
+    cover: bool,
+    duration: int | None,
+    n_weeks: int,
+    format: OutputFormat,
+    json: bool,
+    merge: bool,
+    gap: int,
+    auth: str | None,
+    rooms_per_page: int | Literal["auto"],
+    cache: bool,
+    ttl: float,
+    daemon: bool,
+) -> None:
+    """按时间查找可预约的时空区间
+
+    \b
+        $ bitroom find --from "2023-05-07 14:00" --to "2023-05-07 18:00"
+        $ bitroom find --from "2023-05-07 14:00" --duration 120
+
+    数据来源同 show，也可从 stdin 提供。默认先合并相邻时段，以便查找长时间的空闲。
+
+    从 API 爬取时，只获取需要的周：提供 --to 时只获取涉及的周，否则由近及远逐周查找。
+    若 bitroom serve 在运行且保存了需要的周，则直接向它查询。
+    """
+
+    if t_end is None and duration is None:
+        raise click.UsageError("请提供 --to 或 --duration。")
+
+    from asyncio import run
+
+    from .cache import BookingCache
+
+    query = partial(
+        _find,
+        t_start=t_start,
+        t_end=t_end,
+        cover=cover,
+        duration=timedelta(minutes=duration) if duration is not None else None,
+        gap=timedelta(minutes=gap) if merge else None,
+    )
+
+    # If stdin is empty, ask the daemon or fetch bookings from API.
+    # Otherwise, take stdin.
+    if stdin.isatty():
+        found = None
+        if daemon:
+            params = {
+                "from": t_start.isoformat(),
+                # 二进制格式不保存合并前的时段
+                "format": "json",
+            }
+            if t_end is not None:
+                params["to"] = t_end.isoformat()
+            else:
+                # 同`_find_online`的查找范围
+                params["until"] = (
+                    max(t_start.date(), date.today()) + timedelta(weeks=n_weeks - 1)
+                ).isoformat()
+            if cover:
+                params["cover"] = "1"
+            if duration is not None:
+                params["duration"] = str(duration)
+            if merge:
+                params["gap"] = str(gap)
+            found = _ask_daemon("/find", params)
+
+        if found is None:
+            config = _resolve_config(auth)
+            with BookingCache(ttl=ttl) if cache else nullcontext() as booking_cache:
+                found = run(
+                    _find_online(
+                        config,
+                        query,
+                        t_start=t_start,
+                        t_end=t_end,
+                        n_weeks=n_weeks,
+                        rooms_per_page=rooms_per_page,
+                        cache=booking_cache,
+                    )
+                )
+    else:
+        found = query(_read_stdin())
+
+    _echo_bookings(found, format="json" if json else format)
+
+
+def _find(
+    bookings: list[Booking],
+    *,
+    t_start: datetime,
+    t_end: datetime | None,
+    cover: bool,
+    duration: timedelta | None,
+    gap: timedelta | None,
+) -> list[Booking]:
+    """查找
+
+    :param gap: 合并相邻时段时允许的最大间隔；`None`表示不合并
+    """
+
+    from .index import BookingIndex
+    from .room import coalesce
+
+    if gap is not None:
+        bookings = coalesce(bookings, gap=gap)
+    return BookingIndex(bookings).find(t_start, t_end, cover=cover, duration=duration)
+
+
+async def _find_online(
+    config: Config,
+    query: Callable[[list[Booking]], list[Booking]],
+    *,
+    t_start: datetime,
+    t_end: datetime | None,
+    n_weeks: int,
+    rooms_per_page: int | Literal["auto"],
+    cache: BookingCache | None,
+) -> list[Booking]:
+    """按需爬取并查找
+
+    提供了`t_end`，只获取涉及的周；否则由近及远逐周获取，找到就停止。
+    """
+
+    from .client import build_client
+    from .horizon import BookingHorizon
+
+    async with build_client(config.http) as client:
+        api = await _login(client, config, cache=cache)
+
+        # 过去的周无需获取
+        start = max(t_start.date(), date.today())
+        horizon = BookingHorizon(
+            api,
+            start,
+            until=(
+                max(t_end.date(), start)
+                if t_end is not None
+                else start + timedelta(weeks=n_weeks - 1)
+            ),
+            rooms_per_page=rooms_per_page,
+        )
+
+        if t_end is not None:
+            return query(await horizon.for_range(t_start, t_end))
+
+        # 近的周里的区间一定开始得更早，因此找到就不必再往后了
+        bookings: list[Booking] = []
+        async for week in horizon.iter_weeks():
+            bookings += week
+            if found := query(bookings):
+                return found
+        return []
+
+
+async def _watch(
+    config: Config,
+    *,
+    format: Literal["text", "jsonl"],
+    interval: float,
+    n_weeks: int,
+    rooms_per_page: int | Literal["auto"],
+) -> None:
+    from .client import build_client
+    from .watch import Watcher
+
+    def on_error(error: Exception) -> None:
+        click.echo(
+            f"{click.style('[Warning]', fg='yellow')} 获取失败，到期后重试：{error!r}",
+            err=True,
+        )
+
+    async with build_client(config.http) as client:
+        # 不用缓存，否则有效期内获取不到变化
+        connect = partial(_login, client, config, cache=None, catalog=True)
+        watcher = Watcher(
+            await connect(),
+            interval=interval,
+            n_weeks=n_weeks,
+            rooms_per_page=rooms_per_page,
+            connect=connect,
+            on_error=on_error,
+        )
+
+        async for diff in watcher.watch():
+            if format == "text":
+                click.echo(
+                    "\n".join(
+                        [f"+ {b}" for b in diff.added]
+                        + [f"- {b}" for b in diff.removed]
+                    )
+                )
+            else:
+                click.echo(
+                    "\n".join(dumps(d, ensure_ascii=False) for d in diff.as_dicts())
+                )
+
+
+@cli.command()
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=1),
+    default=60,
+    show_default=True,
+    help="本周的获取间隔，单位为秒；之后每周间隔加倍",
+)
+@click.option(
+    "--weeks",
+    "n_weeks",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="监视的周数",
+)
+@click.option(
+    "--format",
+    type=click.Choice(["text", "jsonl"]),
+    default="jsonl",
+    show_default=True,
+    help="输出格式；jsonl 每行一项，带有“op”字段（added 或 removed）",
+)
+@_crawl_options
+def watch(
+    interval: float,
+    n_weeks: int,
+    format: Literal["text", "jsonl"],
+    auth: str | None,
+    rooms_per_page: int | Literal["auto"],
+) -> None:
+    """监视可预约时空区间的变化
+
+    定期获取，只输出新增、消失的时段。首次获取的结果作为基准，不输出。
+
+    \b
+        $ bitroom watch --interval 30
+        $ bitroom watch --format text | grep "^+"
+    """
+
+    from asyncio import run
+
+    config = _resolve_config(auth)
+    try:
+        run(
+            _watch(
+                config,
+                format=format,
+                interval=interval,
+                n_weeks=n_weeks,
+                rooms_per_page=rooms_per_page,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(
+    config: Config,
+    *,
+    host: str,
+    port: int,
+    interval: float,
+    n_weeks: int,
+    rooms_per_page: int | Literal["auto"],
+) -> None:
+    from .client import build_client
+    from .serve import BookingServer
+
+    def on_error(error: Exception) -> None:
+        click.echo(
+            f"{click.style('[Warning]', fg='yellow')} 刷新失败，稍后重试：{error!r}",
+            err=True,
+        )
+
+    async with build_client(config.http) as client:
+        server = BookingServer(
+            # 不用缓存，否则有效期内获取不到变化
+            partial(_login, client, config, cache=None, catalog=True),
+            interval=interval,
+            n_weeks=n_weeks,
+            rooms_per_page=rooms_per_page,
+            on_error=on_error,
+        )
+        click.echo(f"Serving on http://{host}:{port}", err=True)
+        await server.serve(host, port)
+
+
+@cli.command()
+@click.option("--host", help="监听的地址；默认按配置文件中的 [serve]")
+@click.option(
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    help="监听的端口；默认按配置文件中的 [serve]",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=1),
+    help="本周的刷新间隔，单位为秒，之后每周间隔加倍；默认按配置文件中的 [serve]",
+)
+@click.option(
+    "--weeks",
+    "n_weeks",
+    type=click.IntRange(min=1),
+    help="保存的周数；默认按配置文件中的 [serve]",
+)
+@_crawl_options
+def serve(
+    host: str | None,
+    port: int | None,
+    interval: float | None,
+    n_weeks: int | None,
+    auth: str | None,
+    rooms_per_page: int | Literal["auto"],
+) -> None:
+    """在本地提供查询服务
+
+    只登录一次，不断刷新，在内存中保存最新结果及索引，通过 localhost HTTP 提供查询。
+    show、find、TUI 发现服务在运行，就直接向它查询，几毫秒即可得到结果。
+
+    \b
+        $ bitroom serve &
+        $ bitroom find --from "2023-05-07 14:00" --duration 120
+
+    若 CLI、TUI 要找另外的地址、端口，请写入配置文件的 [serve]。
+    """
+
+    from asyncio import run
+
+    config = _resolve_config(auth)
+    settings = config.serve
+    try:
+        run(
+            _serve(
+                config,
+                host=host if host is not None else settings.host,
+                port=port if port is not None else settings.port,
+                interval=interval if interval is not None else settings.interval,
+                n_weeks=n_weeks if n_weeks is not None else settings.n_weeks,
+                rooms_per_page=rooms_per_page,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,60 @@
+"""共用的 HTTP client
+
+登录、`prepare_headers`、各种查询应共用同一个 client，
+以复用连接，省去反复建立连接的时间。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from httpx import AsyncClient, AsyncHTTPTransport, Limits, Timeout
+
+from .config import HTTPConfig
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+def _has_h2() -> bool:
+    """是否安装了 HTTP/2 所需的 h2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client(http: HTTPConfig | None = None, **kwargs: Any) -> AsyncClient:
+    """构造 client
+
+    连接池、长连接、超时、重试按`http`设置。
+    若安装了 h2（`pip install bitroom[http2]`），且服务器支持，则使用 HTTP/2。
+
+    :param http: 网络设置；默认为`HTTPConfig()`
+    :param kwargs: 传给`AsyncClient`
+
+    # 例子
+
+    ```
+    async with build_client() as client:
+        api = await RoomAPI.login(client, username, password)
+    ```
+    """
+
+    http = http or HTTPConfig()
+
+    transport = AsyncHTTPTransport(
+        limits=Limits(
+            max_connections=http.max_connections,
+            max_keepalive_connections=http.max_connections,
+            keepalive_expiry=http.keepalive_expiry,
+        ),
+        http2=http.http2 and _has_h2(),
+        retries=http.retries,
+    )
+    return AsyncClient(
+        transport=transport,
+        timeout=Timeout(http.timeout, connect=http.connect_timeout),
+        **kwargs,
+    )
@@ -6,13 +6,13 @@ https://github.com/YoungKlaus/BIT_Auto_Leave/blob/895c0bdc7a9d111bdf4230e4e4102e
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from os import getenv
 from pathlib import Path
 from sys import platform, version_info
 from typing import TYPE_CHECKING
 
-from platformdirs import site_config_path, user_config_path
+from platformdirs import site_config_path, user_cache_path, user_config_path
 from platformdirs.unix import Unix
 
 if version_info >= (3, 11):
@@ -48,10 +48,60 @@ def config_paths() -> Generator[Path, None, None]:
         yield dirs.site_config_path / filename
 
 
+def cache_dir() -> Path:
+    """缓存目录
+
+    可用环境变量`$BITROOM_CACHE_DIR`指定；目录不一定已存在。
+    """
+
+    if path_from_env := getenv(f"{_APP_NAME}_cache_dir".upper()):
+        return Path(path_from_env)
+
+    return user_cache_path(_APP_NAME, appauthor=False)
+
+
+@dataclass
+class HTTPConfig:
+    """网络设置，对应配置文件中的`[http]`"""
+
+    timeout: float = 10
+    """一般请求的超时，单位为秒"""
+    connect_timeout: float = 5
+    """建立连接的超时，单位为秒"""
+    page_timeout: float = 20
+    """获取可预约区间时，每页每个房间的超时，单位为秒（服务器很慢）"""
+    max_connections: int = 8
+    """连接池的大小"""
+    keepalive_expiry: float = 30
+    """空闲连接保留多久，单位为秒"""
+    http2: bool = True
+    """是否尝试 HTTP/2（需安装 h2）"""
+    retries: int = 1
+    """连接失败时的重试次数"""
+
+
+@dataclass
+class ServeConfig:
+    """本地服务`bitroom serve`的设置，对应配置文件中的`[serve]`"""
+
+    host: str = "127.0.0.1"
+    """监听的地址；CLI、TUI 也按此查找服务"""
+    port: int = 8726
+    """监听的端口；CLI、TUI 也按此查找服务"""
+    interval: float = 60
+    """本周的刷新间隔，单位为秒；之后每周间隔加倍"""
+    n_weeks: int = 4
+    """保存的周数"""
+    probe_timeout: float = 0.5
+    """CLI、TUI 向服务查询（连接、收发）的超时，单位为秒；超时则自行爬取"""
+
+
 @dataclass
 class Config:
     username: str
     password: str
+    http: HTTPConfig = field(default_factory=HTTPConfig)
+    serve: ServeConfig = field(default_factory=ServeConfig)
 
 
 def read_config() -> Config | None:
@@ -64,4 +114,11 @@ def read_config() -> Config | None:
 
     for path in config_paths():
         if path.exists():
-            return Config(**loads(path.read_text(encoding="utf-8")))
+            raw = loads(path.read_text(encoding="utf-8"))
+            return Config(
+                **raw
+                | {
+                    "http": HTTPConfig(**raw.get("http", {})),
+                    "serve": ServeConfig(**raw.get("serve", {})),
+                }
+            )
@@ -0,0 +1,136 @@
+"""按周按需获取一段时间内的可预约区间
+
+一次获取四周，要等最慢的一周；而多数查询只关心最近几天。
+这里把一段时间分成若干周，各周独立获取、缓存，查询涉及哪几周才获取哪几周，近的周优先。
+"""
+
+from __future__ import annotations
+
+import datetime
+from asyncio import ensure_future, gather
+from typing import TYPE_CHECKING
+
+from .room import n_weeks_until, week_dates
+
+if TYPE_CHECKING:
+    from asyncio import Task
+    from typing import AsyncGenerator, Literal
+
+    from .room import Booking, RoomAPI
+
+
+class BookingHorizon:
+    """一段时间内的可预约区间，按周按需获取
+
+    每周至多获取一次；各周共用`RoomAPI`的房间目录，只试探一次。
+
+    ## 例子
+
+    ```
+    from datetime import date, datetime, timedelta
+
+    horizon = BookingHorizon(api, date.today(), until=date.today() + timedelta(weeks=4))
+
+    # 只获取涉及的周
+    await horizon.for_range(datetime(2023, 5, 7, 14), datetime(2023, 5, 7, 18))
+
+    # 逐周获取，近的周先返回
+    async for bookings in horizon.iter_weeks():
+        print(len(bookings))
+    ```
+    """
+
+    api: RoomAPI
+    monday: datetime.date
+    """第一周的周一"""
+    n_weeks: int
+    rooms_per_page: int | Literal["auto"]
+    _weeks: dict[int, Task[list[Booking]]]
+    """已开始获取的各周"""
+
+    def __init__(
+        self,
+        api: RoomAPI,
+        date: datetime.date,
+        *,
+        until: datetime.date,
+        rooms_per_page: int | Literal["auto"] = 3,
+    ) -> None:
+        """
+        :param date: 从这天所在的一周开始
+        :param until: 到这天所在的一周为止
+        :param rooms_per_page: 同`RoomAPI.fetch_bookings`
+        """
+
+        self.api = api
+        self.monday = week_dates(date)[0]
+        self.n_weeks = n_weeks_until(date, until)
+        self.rooms_per_page = rooms_per_page
+        self._weeks = {}
+
+    def week(self, w: int) -> Task[list[Booking]]:
+        """获取第`w`周（从 0 开始）
+
+        若已开始获取，则返回原来的任务；但若之前失败了，则重新获取。
+        """
+
+        assert 0 <= w < self.n_weeks, f"第 {w} 周超出范围：共 {self.n_weeks} 周"
+
+        task = self._weeks.get(w)
+        if task is None or (
+            task.done() and (task.cancelled() or task.exception() is not None)
+        ):
+            self._weeks[w] = ensure_future(
+                self.api.fetch_bookings(
+                    self.monday + datetime.timedelta(weeks=w),
+                    rooms_per_page=self.rooms_per_page,
+                    n_weeks=1,
+                    priority=w,
+                )
+            )
+        return self._weeks[w]
+
+    @property
+    def loaded(self) -> list[int]:
+        """已获取完的各周"""
+        return sorted(w for w, task in self._weeks.items() if task.done())
+
+    def _week_of(self, date: datetime.date) -> int:
+        return (date - self.monday).days // 7
+
+    async def for_range(
+        self, t_start: datetime.datetime, t_end: datetime.datetime
+    ) -> list[Booking]:
+        """获取 [t_start, t_end] 涉及的各周
+
+        :return: 这几周的全部时段（而非只有与区间重叠的），以便合并相邻时段；
+            超出范围的部分忽略
+        """
+
+        first = max(self._week_of(t_start.date()), 0)
+        last = min(self._week_of(t_end.date()), self.n_weeks - 1)
+        weeks = await gather(*map(self.week, range(first, last + 1)))
+        return [b for bookings in weeks for b in bookings]
+
+    async def all(self) -> list[Booking]:
+        """获取全部各周"""
+        return await self.for_range(
+            datetime.datetime.combine(self.monday, datetime.time()),
+            datetime.datetime.combine(
+                self.monday + datetime.timedelta(weeks=self.n_weeks - 1),
+                datetime.time(),
+            ),
+        )
+
+    async def iter_weeks(
+        self, *, start: int = 0, ahead: int = 1
+    ) -> AsyncGenerator[list[Booking], None]:
+        """从第`start`周起，逐周 yield
+
+        :param ahead: 等待某周时，同时获取之后几周；提前退出则不再获取更远的周
+        """
+
+        for w in range(start, self.n_weeks):
+            for later in range(w + 1, min(w + 1 + ahead, self.n_weeks)):
+                self.week(later)
+            yield await self.week(w)
@@ -0,0 +1,247 @@
+"""按时间索引可预约的时空区间
+
+需求常常是“先时间，后空间”，因此以时间为主键、房间为次键建立索引。
+"""
+
+from __future__ import annotations
+
+import datetime
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from typing import Iterable
+
+    from .room import Booking
+
+T = TypeVar("T", datetime.timedelta, datetime.datetime)
+
+
+class _MaxTree(Generic[T]):
+    """线段树，维护区间最大值，按值查找元素"""
+
+    _size: int
+    _tree: list[T]
+
+    def __init__(self, values: list[T], lowest: T) -> None:
+        """
+        :param lowest: 不大于任何值，用于补齐
+        """
+
+        size = 1
+        while size < len(values):
+            size *= 2
+        self._size = size
+
+        self._tree = [lowest] * size + values + [lowest] * (size - len(values))
+        for i in range(size - 1, 0, -1):
+            self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+
+    def first_at_least(self, start: int, value: T) -> int | None:
+        """下标不小于`start`、值不小于`value`的第一个元素的下标"""
+        return self._descend(1, 0, self._size, start, value)
+
+    def _descend(self, node: int, lo: int, hi: int, start: int, value: T) -> int | None:
+        if hi <= start or self._tree[node] < value:
+            return None
+        if hi - lo == 1:
+            return lo
+
+        mid = (lo + hi) // 2
+        found = self._descend(2 * node, lo, mid, start, value)
+        if found is None:
+            found = self._descend(2 * node + 1, mid, hi, start, value)
+        return found
+
+    def all_above(self, stop: int, value: T) -> list[int]:
+        """下标小于`stop`、值大于`value`的所有元素的下标，按下标排序
+
+        每找到一个需对数时间，不会扫描不符合的元素。
+        """
+
+        found: list[int] = []
+        self._collect(1, 0, self._size, stop, value, found)
+        return found
+
+    def _collect(
+        self, node: int, lo: int, hi: int, stop: int, value: T, found: list[int]
+    ) -> None:
+        if lo >= stop or self._tree[node] <= value:
+            return
+        if hi - lo == 1:
+            found.append(lo)
+            return
+
+        mid = (lo + hi) // 2
+        self._collect(2 * node, lo, mid, stop, value, found)
+        self._collect(2 * node + 1, mid, hi, stop, value, found)
+
+
+class BookingIndex:
+    """可预约时空区间的索引
+
+    按开始时刻排序，辅以时长、结束时刻的线段树，
+    查询均为对数复杂度；列出多个结果时，每个结果另需对数时间。
+
+    ## 例子
+
+    ```
+    from datetime import datetime, timedelta
+
+    index = BookingIndex(bookings)
+    index.overlapping(datetime(2023, 5, 7, 14), datetime(2023, 5, 7, 18))
+    index.earliest(timedelta(hours=2), after=datetime(2023, 5, 7, 14))
+    ```
+    """
+
+    _bookings: list[Booking]
+    """按 (t_start, room_id) 排序"""
+    _starts: list[datetime.datetime]
+    _durations: _MaxTree[datetime.timedelta]
+    """用于查找能容纳某时长的区间"""
+    _ends: _MaxTree[datetime.datetime]
+    """用于查找结束晚于某时刻的区间"""
+    _by_room: dict[str, BookingIndex] | None
+
+    def __init__(self, bookings: Iterable[Booking]) -> None:
+        self._bookings = sorted(bookings, key=lambda b: (b.t_start, b.room_id))
+        self._starts = [b.t_start for b in self._bookings]
+
+        self._durations = _MaxTree(
+            [b.t_end - b.t_start for b in self._bookings], datetime.timedelta.min
+        )
+        self._ends = _MaxTree([b.t_end for b in self._bookings], datetime.datetime.min)
+
+        self._by_room = None
+
+    def __len__(self) -> int:
+        return len(self._bookings)
+
+    def __iter__(self):
+        return iter(self._bookings)
+
+    def room(self, room_id: str) -> BookingIndex:
+        """某一房间的索引"""
+
+        if self._by_room is None:
+            groups: dict[str, list[Booking]] = {}
+            for b in self._bookings:
+                groups.setdefault(b.room_id, []).append(b)
+            self._by_room = {r: BookingIndex(bs) for r, bs in groups.items()}
+
+        return self._by_room.get(room_id) or BookingIndex([])
+
+    def overlapping(
+        self,
+        t_start: datetime.datetime,
+        t_end: datetime.datetime,
+        *,
+        rooms: Iterable[str] | None = None,
+    ) -> list[Booking]:
+        """与 [t_start, t_end) 重叠的区间
+
+        :param rooms: 只考虑这些房间的`room_id`，默认全部
+        """
+
+        if rooms is not None:
+            return sorted(
+                (
+                    b
+                    for r in set(rooms)
+                    for b in self.room(r).overlapping(t_start, t_end)
+                ),
+                key=lambda b: (b.t_start, b.room_id),
+            )
+
+        # 开始早于 t_end，且结束晚于 t_start
+        stop = bisect_left(self._starts, t_end)
+        return [self._bookings[i] for i in self._ends.all_above(stop, t_start)]
+
+    def covering(
+        self,
+        t_start: datetime.datetime,
+        t_end: datetime.datetime,
+        *,
+        rooms: Iterable[str] | None = None,
+    ) -> list[Booking]:
+        """完整包含 [t_start, t_end) 的区间
+
+        :param rooms: 只考虑这些房间的`room_id`，默认全部
+        """
+
+        return [
+            b
+            for b in self.overlapping(t_start, t_end, rooms=rooms)
+            if b.t_start <= t_start and b.t_end >= t_end
+        ]
+
+    def earliest(
+        self,
+        duration: datetime.timedelta,
+        *,
+        after: datetime.datetime | None = None,
+        rooms: Iterable[str] | None = None,
+    ) -> Booking | None:
+        """最早能容纳`duration`的区间
+
+        :param duration: 所需时长
+        :param after: 不早于此时刻开始使用，默认不限
+        :param rooms: 只考虑这些房间的`room_id`，默认全部
+        :return: 找到的区间；它可能在`after`之前就开始了。若找不到，返回`None`
+        """
+
+        if rooms is not None:
+            found = [
+                b
+                for r in set(rooms)
+                if (b := self.room(r).earliest(duration, after=after)) is not None
+            ]
+            return min(
+                found,
+                key=lambda b: (max(b.t_start, after or b.t_start), b.room_id),
+                default=None,
+            )
+
+        start = 0
+        if after is not None:
+            # 在 after 之前开始，但 after 之后还够用
+            start = bisect_left(self._starts, after)
+            i = self._ends.first_at_least(0, after + duration)
+            if i is not None and i < start:
+                return self._bookings[i]
+
+        i = self._durations.first_at_least(start, duration)
+        return self._bookings[i] if i is not None else None
+
+    def find(
+        self,
+        t_start: datetime.datetime,
+        t_end: datetime.datetime | None = None,
+        *,
+        cover: bool = False,
+        duration: datetime.timedelta | None = None,
+    ) -> list[Booking]:
+        """按`bitroom find`的规则查找
+
+        - 提供了`t_end`：与 [t_start, t_end) 重叠（`cover`则为完整包含）的区间；
+          若还提供了`duration`，则只保留重叠部分不短于它的。
+        - 否则：`t_start`以后最早能容纳`duration`的区间，至多一个。
+        """
+
+        if t_end is not None:
+            found = (
+                self.covering(t_start, t_end)
+                if cover
+                else self.overlapping(t_start, t_end)
+            )
+            if duration is not None:
+                found = [
+                    b
+                    for b in found
+                    if min(b.t_end, t_end) - max(b.t_start, t_start) >= duration
+                ]
+            return found
+        else:
+            assert duration is not None, "未提供结束时刻时，须提供所需时长"
+            earliest = self.earliest(duration, after=t_start)
+            return [earliest] if earliest is not None else []
@@ -1,25 +1,60 @@
 from __future__ import annotations
 
 import datetime
-from asyncio import gather
-from dataclasses import asdict, dataclass
-from itertools import chain
+from asyncio import (
+    Semaphore,
+    as_completed,
+    ensure_future,
+    gather,
+    shield,
+    sleep,
+    to_thread,
+)
+from contextlib import aclosing
+from dataclasses import dataclass, field, fields
+from functools import lru_cache, partial
 from json import dumps
 from math import ceil
+from statistics import mean
+from time import perf_counter
 from typing import TYPE_CHECKING
 
+from .auth import auth
+from .catalog import RoomCatalog
+from .scheduler import FetchScheduler
+from .trace import trace
+from .tuning import PageTuner
+
 if TYPE_CHECKING:
-    from typing import Generator
+    from asyncio import Task
+    from typing import (
+        AsyncGenerator,
+        Awaitable,
+        Callable,
+        Generator,
+        Iterable,
+        Literal,
+        TypeVar,
+    )
+
+    from httpx import AsyncClient, Request, Response
+
+    from .auth.session import SessionStore
+    from .cache import BookingCache
+    from .trace import Tracer
 
-    from httpx import AsyncClient, Response
+    T = TypeVar("T")
 
 API_BASE = "http://stu.bit.edu.cn"
+LOGIN_HOST = "login.bit.edu.cn"
 
 
-async def prepare_headers(client: AsyncClient) -> None:
+async def prepare_headers(client: AsyncClient) -> bool:
     """准备请求头
 
     设置 cookie 等。
+
+    :return: 是否处于登录状态（未登录会被重定向到登录页面）
     """
 
     # Get cookie
@@ -35,6 +70,8 @@ async def prepare_headers(client: AsyncClient) -> None:
         }
     )
 
+    return res.url.host != LOGIN_HOST
+
 
 def parse_time_range(time_range: str) -> tuple[datetime.time, datetime.time]:
     """解释时间区间
@@ -88,7 +125,29 @@ def format_datetime_range(time: tuple[datetime.datetime, datetime.datetime]) ->
         return "–".join(t.isoformat(sep=" ", timespec="minutes") for t in time)
 
 
-@dataclass
+def _timed(
+    fn: Callable[[], Awaitable[T]], latencies: list[float]
+) -> Callable[[], Awaitable[T]]:
+    """包装`fn`，把每次调用的用时（秒）追加到`latencies`"""
+
+    async def timed() -> T:
+        t_start = perf_counter()
+        result = await fn()
+        latencies.append(perf_counter() - t_start)
+        return result
+
+    return timed
+
+
+@dataclass(eq=False)
+class _Crawl:
+    """一次进行中的获取"""
+
+    contended: bool = False
+    """期间是否有其它获取同时进行"""
+
+
+@dataclass(slots=True)
 class Booking:
     """可预约的时空区间"""
 
@@ -106,23 +165,35 @@ class Booking:
         )
 
     def as_dict(self) -> dict[str, str]:
-        raw = asdict(self)
-        for k, v in raw.items():
-            if isinstance(v, datetime.datetime):
-                raw[k] = v.isoformat()
+        # 不用`dataclasses.asdict`，它会深复制每个字段
+        raw = {}
+        for f in fields(self):
+            v = getattr(self, f.name)
+            raw[f.name] = v.isoformat() if isinstance(v, datetime.datetime) else v
 
         return raw
 
     @classmethod
     def from_dict(cls, raw: dict[str, str | datetime.datetime]) -> Booking:
-        for k, v in raw.items():
-            if k.startswith("t_") and isinstance(v, str):
-                raw[k] = datetime.datetime.fromisoformat(v)
+        """`as_dict`的逆
 
-        return Booking(**raw)
+        含`slots`的会解释为`FreeInterval`。
+        """
 
+        if "slots" in raw:
+            return FreeInterval.from_dict(raw)
 
-@dataclass
+        return cls(
+            **{
+                k: datetime.datetime.fromisoformat(v)
+                if k.startswith("t_") and isinstance(v, str)
+                else v
+                for k, v in raw.items()
+            }
+        )
+
+
+@dataclass(slots=True)
 class Order(Booking):
     """已预约的时空区间"""
 
@@ -141,6 +212,182 @@ class Order(Booking):
         )
 
 
+@dataclass(slots=True)
+class BookingReport:
+    """批量预约中一组（同一房间、同一天）的结果"""
+
+    room_id: str
+    date: datetime.date
+    bookings: list[Booking]
+    """此组预约的各个时段，按时间排序"""
+    error: Exception | None = None
+    """提交或验证时的异常；`None`表示没有异常"""
+    missing: list[Booking] = field(default_factory=list)
+    """提交后，在已预约的时空区间中没找到的时段（可能被别人抢先了）"""
+
+    @property
+    def ok(self) -> bool:
+        """是否成功"""
+        return self.error is None and not self.missing
+
+
+@dataclass(slots=True)
+class FreeInterval(Booking):
+    """连续的可预约时空区间
+
+    由同一房间、同一天首尾相接（或间隔很短）的若干`Booking`合并而成，可直接用于预约。
+    """
+
+    slots: list[Booking] = field(default_factory=list)
+    """合并前的各个时段"""
+
+    def __str__(self) -> str:
+        return (
+            f"<FreeInterval [{self.room_name}] "
+            f"{format_datetime_range((self.t_start,self.t_end))} "
+            f"({len(self.slots)} slots)>"
+        )
+
+    def as_dict(self) -> dict:
+        raw = Booking(self.room_name, self.room_id, self.t_start, self.t_end).as_dict()
+        raw["slots"] = [s.as_dict() for s in self.slots]
+        return raw
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> FreeInterval:
+        slots = [Booking.from_dict(s) for s in raw["slots"]]
+        return FreeInterval(
+            room_name=raw["room_name"],
+            room_id=raw["room_id"],
+            t_start=datetime.datetime.fromisoformat(raw["t_start"]),
+            t_end=datetime.datetime.fromisoformat(raw["t_end"]),
+            slots=slots,
+        )
+
+
+def coalesce(
+    bookings: Iterable[Booking],
+    *,
+    gap: datetime.timedelta = datetime.timedelta(minutes=10),
+) -> list[FreeInterval]:
+    """合并同一房间、同一天相邻的时段
+
+    :param bookings: 可预约的时空区间
+    :param gap: 两个时段间隔不超过此值即合并（课间一般 5 分钟）
+    :return: 合并后的区间，按房间、时间排序
+
+    # 例子
+
+    ```
+    from datetime import datetime
+
+    merged = coalesce([
+        Booking("R", "1", datetime(2023, 5, 7, 8, 0), datetime(2023, 5, 7, 8, 45)),
+        Booking("R", "1", datetime(2023, 5, 7, 8, 50), datetime(2023, 5, 7, 9, 35)),
+    ])
+    assert len(merged) == 1 and len(merged[0].slots) == 2
+    ```
+    """
+
+    merged: list[FreeInterval] = []
+    for b in sorted(bookings, key=lambda b: (b.room_id, b.t_start)):
+        slots = b.slots if isinstance(b, FreeInterval) else [b]
+
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and last.room_id == b.room_id
+            and last.t_start.date() == b.t_start.date()
+            and b.t_start - last.t_end <= gap
+        ):
+            last.t_end = max(last.t_end, b.t_end)
+            last.slots.extend(slots)
+        else:
+            merged.append(
+                FreeInterval(
+                    room_name=b.room_name,
+                    room_id=b.room_id,
+                    t_start=b.t_start,
+                    t_end=b.t_end,
+                    slots=list(slots),
+                )
+            )
+
+    return merged
+
+
+def week_dates(date: datetime.date) -> list[datetime.date]:
+    """`date`所在一周的日期，周一–周日"""
+    monday = date - datetime.timedelta(days=date.weekday())
+    return [monday + datetime.timedelta(days=d) for d in range(7)]
+
+
+def n_weeks_until(date: datetime.date, until: datetime.date) -> int:
+    """从`date`所在一周到`until`所在一周，共几周
+
+    # 例子
+
+    ```
+    from datetime import date
+
+    assert n_weeks_until(date(2023, 5, 5), date(2023, 5, 7)) == 1
+    assert n_weeks_until(date(2023, 5, 5), date(2023, 5, 8)) == 2
+    ```
+    """
+
+    assert until >= date, f"结束日期早于开始日期：{until} < {date}"
+    return (week_dates(until)[0] - week_dates(date)[0]).days // 7 + 1
+
+
+@lru_cache(maxsize=None)
+def _parse_time_offsets(
+    time_range: str,
+) -> tuple[datetime.timedelta, datetime.timedelta]:
+    """解释时间区间，表示为距零点的时长
+
+    不同的时间区间只有十几种，因此缓存结果。
+    """
+
+    return tuple(
+        datetime.timedelta(hours=t.hour, minutes=t.minute, seconds=t.second)
+        for t in parse_time_range(time_range)
+    )
+
+
+def parse_bookings_data(
+    data: dict, *, dates: list[datetime.date]
+) -> Generator[Booking, None, None]:
+    """Parse a page of data to bookings
+    :param data: API 的原始响应
+    :param dates: 涉及的日期，周一–周日
+    """
+
+    # 各天的零点
+    midnights = [datetime.datetime.combine(d, datetime.time()) for d in dates]
+
+    # 每个房间
+    for room in data["siteInfoList"]:
+        room_name = room["CDMC"]  # 场地名称
+        room_id = room["CDDM"]  # 场地代码
+
+        # 每一天
+        for date_status in room["currentWeekData"]:
+            if date_status["isLock"] or date_status["applyTime"] == "":
+                continue
+
+            midnight = midnights[date_status["XQJ"] - 1]  # XQJ = 星期几
+
+            # 每个时段
+            for time_range in date_status["applyTime"].split(","):
+                start, end = _parse_time_offsets(time_range)
+                yield Booking(
+                    room_name=room_name,
+                    room_id=room_id,
+                    t_start=midnight + start,
+                    t_end=midnight + end,
+                )
+
+
 class RoomAPI:
     """场地预约 API 包装
 
@@ -155,29 +402,142 @@ class RoomAPI:
     ```
     """
 
+    catalog: RoomCatalog
+    """已知的房间"""
+    page_timeout: float
+    """获取可预约区间时，每页每个房间的超时，单位为秒"""
+    offload_threshold: int | None
+    """每页房间数达到此值时，改在线程中解码、解析，以免阻塞事件循环；`None`表示从不"""
     _client: AsyncClient
+    _scheduler: FetchScheduler
+    _cache: BookingCache | None
+    _tracer: Tracer | None
+    _sniffing: Task[dict] | None
+    """进行中的试探"""
+    _crawls: set[_Crawl]
+    """进行中的获取"""
+    _looked_up: set[str]
+    """已为补全名称查找过的房间编号；仍找不到的（如已撤销的房间）不再查找"""
 
     @classmethod
-    async def build(cls, client: AsyncClient) -> RoomAPI:
+    async def build(
+        cls,
+        client: AsyncClient,
+        *,
+        scheduler: FetchScheduler | None = None,
+        cache: BookingCache | None = None,
+        catalog: RoomCatalog | None = None,
+        page_timeout: float = 20,
+        offload_threshold: int | None = None,
+        tracer: Tracer | None = None,
+    ) -> RoomAPI:
         """
         :param client: 已登录的 client，用于后续所有网络请求（会被修改）
+        :param scheduler: 请求调度器，用于限制并发、重试；默认为`FetchScheduler()`
+        :param cache: 本地缓存；默认不缓存
+        :param catalog: 房间目录；默认新建，并从`cache`收集名称
+        :param page_timeout: 获取可预约区间时，每页每个房间的超时，单位为秒
+        :param offload_threshold: 每页房间数达到此值时，改在线程中解码、解析；默认从不
+        :param tracer: 记录各请求、解析的用时等；默认不记录
+        """
+
+        with trace(tracer, "prepare"):
+            await prepare_headers(client)
+        return RoomAPI(
+            client,
+            scheduler=scheduler,
+            cache=cache,
+            catalog=catalog,
+            page_timeout=page_timeout,
+            offload_threshold=offload_threshold,
+            tracer=tracer,
+        )
+
+    @classmethod
+    async def login(
+        cls,
+        client: AsyncClient,
+        username: str,
+        password: str,
+        *,
+        session: SessionStore | None = None,
+        **kwargs,
+    ) -> RoomAPI:
+        """登录并`build`
+
+        :param client: 未登录的 client，用于后续所有网络请求（会被修改）
+        :param username: 学号
+        :param password: 密码
+        :param session: 登录状态的存储；若其中的状态仍有效，则不再重新登录
+        :param kwargs: 传给`build`
+
+        恢复的状态用一次`prepare_headers`验证，过期才重新登录。
         """
 
-        await prepare_headers(client)
-        return RoomAPI(client)
+        tracer = kwargs.get("tracer")
 
-    def __init__(self, client: AsyncClient) -> None:
+        if session is not None and session.load(client, username):
+            with trace(tracer, "prepare", restored=True):
+                logged_in = await prepare_headers(client)
+            if logged_in:
+                return RoomAPI(client, **kwargs)
+            client.cookies.clear()
+
+        with trace(tracer, "auth"):
+            await auth(client, username, password)
+        api = await cls.build(client, **kwargs)
+        if session is not None:
+            session.save(client, username)
+        return api
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        *,
+        scheduler: FetchScheduler | None = None,
+        cache: BookingCache | None = None,
+        catalog: RoomCatalog | None = None,
+        page_timeout: float = 20,
+        offload_threshold: int | None = None,
+        tracer: Tracer | None = None,
+    ) -> None:
         """
         请使用`build`。
         """
 
         self._client = client
+        self._scheduler = scheduler or FetchScheduler()
+        self._cache = cache
+        if catalog is None:
+            catalog = RoomCatalog(cache.room_names() if cache is not None else None)
+        self.catalog = catalog
+        self.page_timeout = page_timeout
+        self.offload_threshold = offload_threshold
+        self._tracer = tracer
+        self._sniffing = None
+        self._crawls = set()
+        self._looked_up = set()
+
+    async def _post(
+        self, url_path: str, *, attributes: dict | None = None, **kwargs
+    ) -> Response:
+        """
+        :param attributes: 额外记入`Span`的信息
+        """
 
-    async def _post(self, url_path: str, **kwargs) -> Response:
-        return await self._client.post(
-            f"{API_BASE}{url_path}",
-            **kwargs,
-        )
+        with trace(
+            self._tracer,
+            "post",
+            endpoint=url_path.rsplit("/", 1)[-1],
+            **(attributes or {}),
+        ) as span:
+            res = await self._client.post(
+                f"{API_BASE}{url_path}",
+                **kwargs,
+            )
+            span["status"] = res.status_code
+            span["bytes"] = len(res.content)
+        return res
 
     async def _fetch_bookings_data(
         self, date: datetime.date, page: int, *, rooms_per_page: int
@@ -201,11 +561,18 @@ class RoomAPI:
                     }
                 )
             },
-            timeout=max(20, 20 * rooms_per_page),  # Yes, it's really slow…
+            timeout=max(1, rooms_per_page) * self.page_timeout,  # It's really slow…
             follow_redirects=True,
+            attributes={
+                "date": date.isoformat(),
+                "page": page,
+                "page_size": rooms_per_page,
+            },
         )
         res.raise_for_status()
-        json = res.json()
+        json = (
+            await to_thread(res.json) if self._offload(rooms_per_page) else res.json()
+        )
         assert (
             json["code"] == "0" and json["msg"] == "成功"
         ), f"Fetching bookings data failed with {json['code']} “{json['msg']}”."
@@ -214,32 +581,16 @@ class RoomAPI:
 
     def _parse_bookings_data(
         self, data: dict, *, dates: list[datetime.date]
-    ) -> Generator[Booking, None, None]:
+    ) -> list[Booking]:
         """Parse a page of data to bookings
-        :param data: API 的原始响应
-        :param dates: 涉及的日期，周一–周日
+
+        参见`parse_bookings_data`。
         """
 
-        # 每个房间
-        for room in data["siteInfoList"]:
-            # 每一天
-            for date_status in room["currentWeekData"]:
-                if date_status["isLock"] or date_status["applyTime"] == "":
-                    continue
-
-                # 每个时段
-                for time_range in date_status["applyTime"].split(","):
-                    t_start, t_end = (
-                        # XQJ = 星期几
-                        datetime.datetime.combine(dates[date_status["XQJ"] - 1], t)
-                        for t in parse_time_range(time_range)
-                    )
-                    yield Booking(
-                        room_name=room["CDMC"],  # 场地名称
-                        room_id=room["CDDM"],  # 场地代码
-                        t_start=t_start,
-                        t_end=t_end,
-                    )
+        with trace(self._tracer, "parse", rooms=len(data["siteInfoList"])) as span:
+            bookings = list(parse_bookings_data(data, dates=dates))
+            span["bookings"] = len(bookings)
+        return bookings
 
     async def _fetch_bookings_page(
         self,
@@ -260,67 +611,274 @@ class RoomAPI:
         data = await self._fetch_bookings_data(
             date, page=page, rooms_per_page=rooms_per_page
         )
-        return list(self._parse_bookings_data(data, dates=dates))
+        self.catalog.update(data["siteInfoList"])
+        if self._cache is not None:
+            self._cache.put_page(
+                dates[0], page, data["siteInfoList"], rooms_per_page=rooms_per_page
+            )
+        if self._offload(rooms_per_page):
+            return await to_thread(self._parse_bookings_data, data, dates=dates)
+        return self._parse_bookings_data(data, dates=dates)
+
+    def _offload(self, rooms_per_page: int) -> bool:
+        """是否在线程中解码、解析这么大的页"""
+        return (
+            self.offload_threshold is not None
+            and rooms_per_page >= self.offload_threshold
+        )
 
     async def fetch_bookings(
         self,
         date: datetime.date,
         *,
-        rooms_per_page=3,
+        rooms_per_page: int | Literal["auto"] = 3,
         n_weeks=2,
+        until: datetime.date | None = None,
+        priority=0,
+        use_cache=True,
     ) -> list[Booking]:
         """获取可预约的时空区间
 
         :param date: 日期
-        :param rooms_per_page: 访问 API 时每页房间数量
+        :param rooms_per_page: 访问 API 时每页房间数量；`"auto"`表示自动调节
         :param n_weeks: 获取的时间范围，1 代表只获取相邻一周，2 代表相邻一周和再下一周
+        :param until: 获取到哪天所在的一周为止；若提供，则忽略`n_weeks`
+        :param priority: 最近一周请求的优先级，之后每周加一；越小越优先
+        :param use_cache: 是否直接使用`BookingCache`中新鲜的页；
+            为`False`则一律请求（如用户要求刷新时），结果仍写入缓存
         :yield: 相邻几周可预约的时空区间
 
         “相邻一周”指周一–周日。
         例如假设5月1日为周一，查询 5月5日，则会返回5月1–7日的情况。
 
+        所有请求都经过`FetchScheduler`：并发数有上限，超时、5xx 会重试，近的周优先。
+
+        若设置了`BookingCache`，新鲜的页直接从缓存读取，只请求过期的页（除非`use_cache=False`）。
+
+        要等所有页都获取完才返回；若想尽早拿到部分结果，请用`iter_bookings`。
+
         # 玄学
 
         响应时间与 rooms_per_page 近似线性正相关。
 
         若不并发，rooms_per_page=10 时单位时间获取的房间最多。
+        并发时的最佳设置随服务器状况变化，可用 rooms_per_page="auto" 自动调节：
+        按之前的测量结果选择每页房间数量、并发数，测量第一轮请求的用时，并保存结果供下次参考。
         """
 
-        # 首先试探，取得基本数据
-        # 只获取一项响应更快
-        sniff_data = await self._fetch_bookings_data(date, page=0, rooms_per_page=1)
+        if until is not None:
+            n_weeks = n_weeks_until(date, until)
+
+        return [
+            b
+            async for bookings in self._iter_booking_pages(
+                date,
+                rooms_per_page=rooms_per_page,
+                n_weeks=n_weeks,
+                ordered=True,
+                priority=priority,
+                use_cache=use_cache,
+            )
+            for b in bookings
+        ]
 
-        dates = [date.fromisoformat(it["WEEKDATE"]) for it in sniff_data["weekList"]]
+    async def iter_booking_pages(
+        self,
+        date: datetime.date,
+        *,
+        rooms_per_page: int | Literal["auto"] = 3,
+        n_weeks=2,
+        until: datetime.date | None = None,
+        priority=0,
+        use_cache=True,
+    ) -> AsyncGenerator[list[Booking], None]:
+        """逐页获取可预约的时空区间
+
+        参数同`fetch_bookings`。
+
+        每获取完一页就 yield 该页，先完成的先 yield：
+        缓存中的页最先，然后大致按周从近到远。
+        """
+
+        if until is not None:
+            n_weeks = n_weeks_until(date, until)
+
+        async for bookings in self._iter_booking_pages(
+            date,
+            rooms_per_page=rooms_per_page,
+            n_weeks=n_weeks,
+            ordered=False,
+            priority=priority,
+            use_cache=use_cache,
+        ):
+            yield bookings
+
+    async def iter_bookings(
+        self,
+        date: datetime.date,
+        *,
+        rooms_per_page: int | Literal["auto"] = 3,
+        n_weeks=2,
+        until: datetime.date | None = None,
+        priority=0,
+        use_cache=True,
+    ) -> AsyncGenerator[Booking, None]:
+        """逐个获取可预约的时空区间
+
+        参数同`fetch_bookings`，顺序同`iter_booking_pages`。
+
+        # 例子
+
+        ```
+        async for booking in api.iter_bookings(date.today()):
+            print(booking)
+        ```
+        """
+
+        async for bookings in self.iter_booking_pages(
+            date,
+            rooms_per_page=rooms_per_page,
+            n_weeks=n_weeks,
+            until=until,
+            priority=priority,
+            use_cache=use_cache,
+        ):
+            for b in bookings:
+                yield b
+
+    async def _iter_booking_pages(
+        self,
+        date: datetime.date,
+        *,
+        rooms_per_page: int | Literal["auto"],
+        n_weeks: int,
+        ordered: bool,
+        priority: int,
+        use_cache: bool,
+    ) -> AsyncGenerator[list[Booking], None]:
+        """
+        :param ordered: 是否按周、页的顺序 yield；否则按完成的先后
+        :param priority: 最近一周请求的优先级
+        """
+
+        tuner = None
+        limit = None
+        if rooms_per_page == "auto":
+            tuner = PageTuner.load()
+            # 共用的并发上限是硬性的，只在其内调节
+            tuner.max_max_concurrency = min(
+                tuner.max_max_concurrency, self._scheduler.max_concurrency
+            )
+            rooms_per_page, concurrency = tuner.suggest()
+            concurrency = min(concurrency, self._scheduler.max_concurrency)
+            # 只限制此次获取，不改共用的调度器，以免影响同时进行的其它请求
+            limit = Semaphore(concurrency)
+        assert rooms_per_page >= 1, f"每页房间数量必须为正：{rooms_per_page}"
+        latencies: list[float] = []
+        """第一轮请求每页的用时"""
+
+        dates = week_dates(date)
         """此次查询相邻一周的日期，周一–周日"""
 
-        n_rooms = int(sniff_data["siteInfoList"][0]["totalCount"])
+        if not self.catalog.is_fresh():
+            # 目录过期，先试探，取得房间总数
+            await self._sniff(date, priority=priority - 1)
+        assert self.catalog.total_count is not None
+        n_rooms = self.catalog.total_count
         n_pages = ceil(n_rooms / rooms_per_page)
 
-        # 然后获取所有数据
-        fetch_plans = []
-        # 每一周
-        for w in range(n_weeks):
+        def plan(w: int, p: int) -> Awaitable[list[Booking]]:
+            """获取第`w`周第`p`页的计划"""
+
             shift = datetime.timedelta(weeks=w)
-            shifted_date = date + shift
             shifted_dates = [d + shift for d in dates]
 
-            fetch_plans.extend(
-                self._fetch_bookings_page(
-                    page=p,
-                    date=shifted_date,
-                    rooms_per_page=rooms_per_page,
-                    dates=shifted_dates,
+            # 缓存中新鲜的页无需请求
+            cached = (
+                self._cache.get_page(shifted_dates[0], p, rooms_per_page=rooms_per_page)
+                if self._cache is not None and use_cache
+                else None
+            )
+            if cached is not None:
+                self.catalog.update(cached)
+                bookings = self._parse_bookings_data(
+                    {"siteInfoList": cached}, dates=shifted_dates
                 )
-                for p in range(n_pages)
+                return sleep(0, bookings)
+
+            fetch = partial(
+                self._fetch_bookings_page,
+                page=p,
+                date=date + shift,
+                rooms_per_page=rooms_per_page,
+                dates=shifted_dates,
             )
+            if tuner is not None and w == 0 and p < concurrency:
+                fetch = _timed(fetch, latencies)
+            # 越近的周越优先
+            return self._scheduler.run(fetch, priority=priority + w, limit=limit)
+
+        # 同时进行的获取会互相拖慢，此时测得的用时不能代表设置的好坏
+        crawl = _Crawl(contended=bool(self._crawls))
+        for other in self._crawls:
+            other.contended = True
+        self._crawls.add(crawl)
+
+        # 然后获取所有数据，每一周、每一页
+        tasks = [
+            ensure_future(plan(w, p)) for w in range(n_weeks) for p in range(n_pages)
+        ]
+        try:
+            for task in tasks if ordered else as_completed(tasks):
+                yield await task
+
+            # 目录中的房间总数已由各页更新；若房间变多，补充获取多出的页
+            n_pages_now = ceil(self.catalog.total_count / rooms_per_page)
+            extra_tasks = [
+                ensure_future(plan(w, p))
+                for w in range(n_weeks)
+                for p in range(n_pages, n_pages_now)
+            ]
+            tasks += extra_tasks
+            for task in extra_tasks if ordered else as_completed(extra_tasks):
+                yield await task
+        finally:
+            # 提前退出时，取消剩余请求
+            for task in tasks:
+                task.cancel()
+            self.catalog.save()
+            self._crawls.discard(crawl)
+
+        if tuner is not None and latencies and not crawl.contended:
+            tuner.record(rooms_per_page, concurrency, latency=mean(latencies))
+            tuner.save()
+
+    def build_book_request(
+        self,
+        booking: Booking | list[Booking],
+        *,
+        tel: str,
+        applicant: str,
+        description: str | None = None,
+        remark: str | None = None,
+    ) -> Request:
+        """构造预约请求，参数同`book`
 
-        # 每一页的结果
-        bookings_set = await gather(*fetch_plans)
+        构造好的请求可以稍后用`send_book_request`发出，也可重复发出。
+        请求带有构造时的 cookie，重新登录后须重新构造。
+        """
 
-        # Flatten
-        return list(chain.from_iterable(bookings_set))
+        return self.build_form_request(
+            self.book_form(
+                booking,
+                tel=tel,
+                applicant=applicant,
+                description=description,
+                remark=remark,
+            )
+        )
 
-    async def book(
+    def book_form(
         self,
         booking: Booking | list[Booking],
         *,
@@ -328,58 +886,73 @@ class RoomAPI:
         applicant: str,
         description: str | None = None,
         remark: str | None = None,
-    ) -> None:
-        """预约
+    ) -> dict[str, str]:
+        """预约请求的表单，参数同`book`
 
-        :param booking: 要预约的时空区间，可多个，但必须同一天、同一房间
-        :param tel: 联系电话
-        :param applicant: 申请人姓名
-        :param description: 申请陈述
-        :param remark: 备注
+        已序列化，与登录状态无关，可提前准备，再用`build_form_request`构造请求。
         """
 
-        bookings = booking if isinstance(booking, list) else [booking]
+        bookings = [
+            slot
+            for b in (booking if isinstance(booking, list) else [booking])
+            for slot in (b.slots if isinstance(b, FreeInterval) else [b])
+        ]
         assert all(
             b.room_id == bookings[0].room_id
             and b.t_start.date() == bookings[0].t_start.date()
             for b in bookings
         ), f"预约必须不是同一天、同一房间，请分多次预约：{bookings}"
 
-        res = await self._post(
-            "/xsfw/sys/cdyyapp/modules/CdyyApplyController/saveReserveSite.do",
-            data={
-                "data": dumps(
-                    {
-                        # 场地代码-显示
-                        "CDDM_DISPLAY": bookings[0].room_name,
-                        # 场地代码
-                        "CDDM": bookings[0].room_id,
-                        # 预约日期
-                        "YYRQ": bookings[0].t_start.date().isoformat(),
-                        # 使用时段
-                        "SYSD": ",".join(
-                            format_time_range((b.t_start.time(), b.t_end.time()))
-                            for b in bookings
-                        ),
-                        # 申请陈述
-                        "SQCS": description or "",
-                        # 备注
-                        "BZ": remark or "",
-                        # 联系电话
-                        "LXDH": tel,
-                        # 申请人姓名
-                        "SQRXM": applicant,
-                        # 单位代码（无用）
-                        "DWDM": "299792458",  # 光在真空中的速率（m/s）
-                        # 申请编码（无用）
-                        "SQBM": "",
-                        # 审核状态（无用）
-                        "SHZT": "90",
-                    }
-                )
-            },
+        return {
+            "data": dumps(
+                {
+                    # 场地代码-显示
+                    "CDDM_DISPLAY": bookings[0].room_name,
+                    # 场地代码
+                    "CDDM": bookings[0].room_id,
+                    # 预约日期
+                    "YYRQ": bookings[0].t_start.date().isoformat(),
+                    # 使用时段
+                    "SYSD": ",".join(
+                        format_time_range((b.t_start.time(), b.t_end.time()))
+                        for b in bookings
+                    ),
+                    # 申请陈述
+                    "SQCS": description or "",
+                    # 备注
+                    "BZ": remark or "",
+                    # 联系电话
+                    "LXDH": tel,
+                    # 申请人姓名
+                    "SQRXM": applicant,
+                    # 单位代码（无用）
+                    "DWDM": "299792458",  # 光在真空中的速率（m/s）
+                    # 申请编码（无用）
+                    "SQBM": "",
+                    # 审核状态（无用）
+                    "SHZT": "90",
+                }
+            )
+        }
+
+    def build_form_request(self, form: dict[str, str]) -> Request:
+        """用`book_form`的表单构造预约请求，带有当前的 cookie"""
+
+        return self._client.build_request(
+            "POST",
+            f"{API_BASE}/xsfw/sys/cdyyapp/modules/CdyyApplyController/saveReserveSite.do",
+            data=form,
         )
 
+    async def send_book_request(self, request: Request) -> None:
+        """发出`build_book_request`构造的请求"""
+
+        with trace(
+            self._tracer, "post", endpoint=request.url.path.rsplit("/", 1)[-1]
+        ) as span:
+            res = await self._client.send(request)
+            span["status"] = res.status_code
+            span["bytes"] = len(res.content)
         res.raise_for_status()
         json = res.json()
         # 似乎服务端没验证，永远成功
@@ -387,11 +960,151 @@ class RoomAPI:
             json["code"] == "0" and json["msg"] == "成功"
         ), f"Booking failed with {json['code']} “{json['msg']}”."
 
+    async def book(
+        self,
+        booking: Booking | list[Booking],
+        *,
+        tel: str,
+        applicant: str,
+        description: str | None = None,
+        remark: str | None = None,
+    ) -> None:
+        """预约
+
+        :param booking: 要预约的时空区间，可多个，但必须同一天、同一房间；
+            `FreeInterval`会展开为各个时段
+        :param tel: 联系电话
+        :param applicant: 申请人姓名
+        :param description: 申请陈述
+        :param remark: 备注
+        """
+
+        await self.send_book_request(
+            self.build_book_request(
+                booking,
+                tel=tel,
+                applicant=applicant,
+                description=description,
+                remark=remark,
+            )
+        )
+
+    async def ping(self) -> bool:
+        """确认仍处于登录状态，顺便保持与服务器的连接
+
+        :return: 是否处于登录状态
+        """
+        return await prepare_headers(self._client)
+
+    async def _sniff(self, date: datetime.date, *, priority: int) -> None:
+        """试探，取得房间总数，更新`catalog`
+
+        同时查询多周时，只试探一次。
+        """
+
+        task = self._sniffing
+        if task is None:
+            # 只获取一项响应更快
+            task = self._sniffing = ensure_future(
+                self._scheduler.run(
+                    lambda: self._fetch_bookings_data(date, page=0, rooms_per_page=1),
+                    priority=priority,
+                )
+            )
+
+            def forget(_: Task) -> None:
+                self._sniffing = None
+
+            task.add_done_callback(forget)
+
+        # 某一查询提前退出时，不影响其它查询
+        data = await shield(task)
+        self.catalog.update(data["siteInfoList"])
+
+    async def book_many(
+        self,
+        bookings: Iterable[Booking],
+        *,
+        tel: str,
+        applicant: str,
+        description: str | None = None,
+        remark: str | None = None,
+        verify=True,
+    ) -> list[BookingReport]:
+        """批量预约
+
+        :param bookings: 要预约的时空区间，可以是不同房间、不同天；
+            `FreeInterval`会展开为各个时段，重复的时段只预约一次
+        :param tel, applicant, description, remark: 同`book`
+        :param verify: 提交后是否用`fetch_orders`确认各时段确实预约到了
+        :return: 各组的结果，按日期、房间排序
+
+        按（房间, 日期）分组，每组的时段合并为一次`book`（`SYSD`含该组所有时段），
+        各组经`FetchScheduler`并发提交，近的日期优先。
+        提交不重试，以免重复预约。某组失败不影响其它组，失败原因记在报告中。
+        """
+
+        groups: dict[tuple[str, datetime.date], dict[tuple, Booking]] = {}
+        for b in bookings:
+            for slot in b.slots if isinstance(b, FreeInterval) else [b]:
+                group = groups.setdefault((slot.room_id, slot.t_start.date()), {})
+                group.setdefault((slot.t_start, slot.t_end), slot)
+
+        reports = [
+            BookingReport(
+                room_id=room_id,
+                date=date,
+                bookings=sorted(group.values(), key=lambda b: b.t_start),
+            )
+            for (room_id, date), group in sorted(
+                groups.items(), key=lambda item: (item[0][1], item[0][0])
+            )
+        ]
+        dates = sorted({r.date for r in reports})
+
+        async def submit(report: BookingReport) -> None:
+            priority = dates.index(report.date)
+            try:
+                await self._scheduler.run(
+                    partial(
+                        self.book,
+                        report.bookings,
+                        tel=tel,
+                        applicant=applicant,
+                        description=description,
+                        remark=remark,
+                    ),
+                    priority=priority,
+                    retries=0,
+                )
+                if verify:
+                    orders = await self._scheduler.run(
+                        partial(self.fetch_orders, report.room_id, report.date),
+                        priority=priority,
+                    )
+                    report.missing = [
+                        b
+                        for b in report.bookings
+                        if not any(
+                            o.applicant == applicant
+                            and o.t_start <= b.t_start
+                            and o.t_end >= b.t_end
+                            for o in orders
+                        )
+                    ]
+            except Exception as error:
+                report.error = error
+
+        await gather(*map(submit, reports))
+        return reports
+
     async def fetch_orders(self, room_id: str, date: datetime.date) -> list[Order]:
         """获取已预约的时空区间
 
         :param room_id:
         :param date: 日期
+
+        房间名称取自`catalog`，未收录则为“<unknown>”。
         """
 
         res = await self._post(
@@ -413,8 +1126,7 @@ class RoomAPI:
 
             orders.append(
                 Order(
-                    # todo: room name
-                    room_name="<unknown>",
+                    room_name=self.catalog.name(room_id),
                     room_id=room_id,
                     applicant=row["SQRXM"],  # 申请人姓名
                     tel=row["LXDH"],  # 联系电话
@@ -424,3 +1136,53 @@ class RoomAPI:
                 )
             )
         return orders
+
+    async def fetch_orders_bulk(
+        self,
+        room_ids: Iterable[str],
+        dates: Iterable[datetime.date],
+        *,
+        resolve_names=True,
+    ) -> list[Order]:
+        """获取多个房间、多天已预约的时空区间
+
+        :param room_ids: 房间编号
+        :param dates: 日期
+        :param resolve_names: 若有房间不在`catalog`中，先逐页获取一周的可预约区间
+            以补全名称，找齐即停；每个房间只查找一次，仍找不到则名称用其编号
+        :return: 所有结果，按开始时刻、房间排序
+
+        重复的（房间, 日期）只请求一次；请求经过`FetchScheduler`，近的日期优先。
+        """
+
+        room_ids = list(dict.fromkeys(room_ids))
+        dates = sorted(set(dates))
+
+        unknown = {
+            r for r in room_ids if r not in self.catalog and r not in self._looked_up
+        }
+        if resolve_names and dates and unknown:
+            self._looked_up |= unknown
+            # 各页会更新`catalog`；找齐后立即关闭，取消剩余请求
+            async with aclosing(self.iter_booking_pages(dates[0], n_weeks=1)) as pages:
+                async for _ in pages:
+                    if all(r in self.catalog for r in unknown):
+                        break
+
+        orders_set = await gather(
+            *(
+                self._scheduler.run(partial(self.fetch_orders, r, d), priority=i)
+                for i, d in enumerate(dates)
+                for r in room_ids
+            )
+        )
+
+        orders = sorted(
+            (o for orders in orders_set for o in orders),
+            key=lambda o: (o.t_start, o.room_id),
+        )
+        if resolve_names:
+            for o in orders:
+                if o.room_id not in self.catalog:
+                    o.room_name = o.room_id
+        return orders
@@ -0,0 +1,146 @@
+"""请求调度
+
+服务器响应慢，且并发过多时会整体停滞，因此限制并发、按优先级排队、失败重试。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import nullcontext
+from heapq import heappop, heappush
+from itertools import count
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    from typing import Awaitable, Callable
+
+T = TypeVar("T")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """是否值得重试
+
+    超时、连接中断、服务器 5xx 错误值得重试；其它错误（如 4xx、数据不合法）重试也无用。
+    """
+
+    from httpx import HTTPStatusError, TimeoutException, TransportError
+
+    if isinstance(error, HTTPStatusError):
+        return error.response.is_server_error
+    return isinstance(error, (TimeoutException, TransportError))
+
+
+class FetchScheduler:
+    """有限并发、分优先级、失败重试地执行请求
+
+    `priority`越小越优先；同一优先级先到先得。
+    某一批请求若要更严的并发限制，可在`run`时传入自己的`limit`，不必修改共用的`max_concurrency`。
+
+    ## 例子
+
+    ```
+    scheduler = FetchScheduler(max_concurrency=4)
+    res = await scheduler.run(lambda: client.get(url), priority=0)
+    ```
+    """
+
+    retries: int
+    """每个请求失败后最多重试几次"""
+    backoff: float
+    """首次重试前等待的秒数，此后每次翻倍"""
+
+    _max_concurrency: int
+    _active: int
+    _waiters: list[tuple[int, int, asyncio.Future[None]]]
+    _counter: count
+
+    def __init__(
+        self, max_concurrency: int = 4, *, retries: int = 2, backoff: float = 1.0
+    ) -> None:
+        assert max_concurrency >= 1, f"并发数必须为正：{max_concurrency}"
+
+        self._max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+
+        self._active = 0
+        self._waiters = []
+        self._counter = count()
+
+    @property
+    def max_concurrency(self) -> int:
+        """最多同时进行的请求数
+
+        可随时修改，调大后排队的请求会立即开始。
+        """
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, value: int) -> None:
+        assert value >= 1, f"并发数必须为正：{value}"
+        self._max_concurrency = value
+        self._wake_up()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self._max_concurrency and not self._waiters:
+            self._active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heappush(self._waiters, (priority, next(self._counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分到名额，但被取消了，转交给下一位
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        while self._waiters and self._active < self._max_concurrency:
+            _, _, waiter = heappop(self._waiters)
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        priority: int = 0,
+        retries: int | None = None,
+        limit: asyncio.Semaphore | None = None,
+    ) -> T:
+        """执行请求
+
+        :param fn: 发出请求的函数，每次尝试都会重新调用
+        :param priority: 优先级，越小越优先
+        :param retries: 此次的最多重试次数，默认为`self.retries`；
+            不能重复的请求（如预约）应设为 0
+        :param limit: 此批请求自己的并发限制，与`max_concurrency`同时生效
+        :return: `fn`的结果
+
+        重试的等待期间不占并发名额（包括`limit`的）。重试次数用完仍失败，则抛出最后一次的异常。
+        """
+
+        if retries is None:
+            retries = self.retries
+
+        for attempt in range(retries + 1):
+            async with limit if limit is not None else nullcontext():
+                await self._acquire(priority)
+                try:
+                    return await fn()
+                except Exception as error:
+                    if attempt == retries or not is_retryable(error):
+                        raise
+                finally:
+                    self._release()
+
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+        raise AssertionError("unreachable")
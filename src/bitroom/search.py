@@ -0,0 +1,326 @@
+"""搜索可预约的时空区间
+
+供 TUI 的搜索框使用。每次载入数据时建立一次索引，
+之后每次按键只比较预先规范化的字符串、整数。
+
+搜索词以空白分隔，须全部满足：
+
+- 普通词：在房间名称、代号、日期、星期、时刻中查找，忽略大小写、全角半角。
+  日期可写作`2023-05-07`、`05-07`、`5月7日`，星期可写作`周日`、`星期日`、`sun`、`sunday`。
+- `room:<词>`：房间名称或代号包含此词。
+- `date:<词>`：日期或星期包含此词。
+- `after:<HH:MM>`、`before:<HH:MM>`：不早于此时刻开始、不晚于此时刻结束。
+- `dur>=<分钟>`：时长满足条件；也支持`>`、`<=`、`<`、`=`。
+
+未写完的结构化词（如`after:1`）暂时忽略，以免输入过程中结果突然清空。
+
+## 例子
+
+```
+index = SearchIndex(bookings)
+index.search("睿信 after:14:00 dur>=90")  # 下标列表
+index.search("睿信 after:14:00 dur>=120")  # 只在上次结果中查找
+```
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from unicodedata import normalize
+
+from .room import format_datetime_range
+
+if TYPE_CHECKING:
+    import datetime
+    from typing import Callable, Iterable, Literal
+
+    from .room import Booking
+
+    Field = Literal["text", "room", "date", "start", "end", "duration"]
+    Op = Literal["in", ">=", ">", "<=", "<", "="]
+
+
+_WEEKDAYS = ["一", "二", "三", "四", "五", "六", "日"]
+_WEEKDAYS_EN = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+_COMPARE: dict[str, Callable[[int, int], bool]] = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "=": operator.eq,
+}
+
+_STRUCTURED = re.compile(r"(room|date|after|before):|dur[<>=]")
+_TEXT_FIELD = re.compile(r"(room|date):(.+)")
+_TIME_FIELD = re.compile(r"(after|before):(\d{1,2}):(\d{2})")
+_DURATION = re.compile(r"dur(>=|<=|>|<|=)(\d+)")
+
+
+def normalize_text(text: str) -> str:
+    """规范化：统一全角半角，忽略大小写"""
+    return normalize("NFKC", text).casefold()
+
+
+@dataclass(frozen=True, slots=True)
+class Term:
+    """一个搜索词"""
+
+    field: Field
+    """比较的对象；`start`、`end`为一天中的分钟数，`duration`为分钟数"""
+    op: Op
+    """`in`表示`value`是其子串"""
+    value: str | int
+
+    def implies(self, other: Term) -> bool:
+        """满足`self`者是否一定满足`other`"""
+
+        if self.field != other.field:
+            return False
+
+        if self.op == "in" or other.op == "in":
+            return (
+                self.op == other.op == "in"
+                and isinstance(self.value, str)
+                and isinstance(other.value, str)
+                and other.value in self.value
+            )
+
+        assert isinstance(self.value, int) and isinstance(other.value, int)
+        if other.op == "=":
+            return self.op == "=" and self.value == other.value
+
+        # 把各比较看作下界或上界：(值, 是否严格)
+        if other.op in (">=", ">"):
+            if self.op not in (">=", ">", "="):
+                return False
+            sign = 1
+        else:
+            if self.op not in ("<=", "<", "="):
+                return False
+            sign = -1
+
+        mine = sign * self.value
+        theirs = sign * other.value
+        return mine > theirs or (
+            mine == theirs and (self.op in (">", "<") or other.op in (">=", "<="))
+        )
+
+
+def parse_query(keyword: str) -> tuple[Term, ...]:
+    """解析搜索词
+
+    结果已去重，顺序同输入。
+    """
+
+    terms: list[Term] = []
+    for token in normalize_text(keyword).split():
+        if m := _TEXT_FIELD.fullmatch(token):
+            term = Term(m[1], "in", m[2])  # type: ignore[arg-type]
+        elif m := _TIME_FIELD.fullmatch(token):
+            minutes = int(m[2]) * 60 + int(m[3])
+            term = (
+                Term("start", ">=", minutes)
+                if m[1] == "after"
+                else Term("end", "<=", minutes)
+            )
+        elif m := _DURATION.fullmatch(token):
+            term = Term("duration", m[1], int(m[2]))  # type: ignore[arg-type]
+        elif _STRUCTURED.match(token):
+            # 尚未写完
+            continue
+        else:
+            term = Term("text", "in", token)
+
+        if term not in terms:
+            terms.append(term)
+    return tuple(terms)
+
+
+def _narrows(new: tuple[Term, ...], old: tuple[Term, ...]) -> bool:
+    """满足`new`者是否一定满足`old`"""
+    return all(any(n.implies(o) for n in new) for o in old)
+
+
+def _minutes(time: datetime.datetime) -> int:
+    return time.hour * 60 + time.minute
+
+
+class SearchIndex:
+    """可预约时空区间的搜索索引
+
+    下标即在`bookings`中的位置。
+    若新的搜索词比之前某次更严格（如在末尾继续输入），则只在那次的结果中查找；
+    退格回到之前的搜索词时，直接返回之前的结果。
+    """
+
+    bookings: list[Booking]
+    _texts: list[str]
+    """各项规范化后的房间、日期、星期、时刻等，以换行分隔"""
+    _rooms: list[str]
+    _dates: list[str]
+    _starts: array[int]
+    """开始时刻，一天中的分钟数"""
+    _ends: array[int]
+    """结束时刻，一天中的分钟数"""
+    _durations: array[int]
+    """时长，单位为分钟"""
+    _room_tokens: dict[tuple[str, str], str]
+    """各房间的`_rooms`，以便共用"""
+    _slot_tokens: dict[
+        tuple[datetime.datetime, datetime.datetime], tuple[str, str, int, int, int]
+    ]
+    """各时段的`_dates`、`_texts`的后半部分、开始、结束、时长，以便共用"""
+    _history: list[tuple[tuple[Term, ...], list[int]]]
+    """最近的搜索及结果，新的在后"""
+    history_size: int = 16
+
+    def __init__(self, bookings: Iterable[Booking] = ()) -> None:
+        self.bookings = []
+        self._texts = []
+        self._rooms = []
+        self._dates = []
+        self._starts = array("H")
+        self._ends = array("H")
+        self._durations = array("L")
+        self._room_tokens = {}
+        self._slot_tokens = {}
+        self._history = []
+
+        self.extend(bookings)
+
+    def __len__(self) -> int:
+        return len(self.bookings)
+
+    def _room_token(self, booking: Booking) -> str:
+        key = (booking.room_name, booking.room_id)
+        token = self._room_tokens.get(key)
+        if token is None:
+            token = self._room_tokens[key] = normalize_text("\n".join(key))
+        return token
+
+    def _slot_token(self, booking: Booking) -> tuple[str, str, int, int, int]:
+        key = (booking.t_start, booking.t_end)
+        token = self._slot_tokens.get(key)
+        if token is None:
+            t_start, t_end = key
+            date = t_start.date()
+            weekday = date.weekday()
+            dates = normalize_text(
+                "\n".join(
+                    [
+                        date.isoformat(),
+                        f"{date.month:02d}-{date.day:02d}",
+                        f"{date.month}月{date.day}日",
+                        f"周{_WEEKDAYS[weekday]}",
+                        f"星期{_WEEKDAYS[weekday]}",
+                        _WEEKDAYS_EN[weekday],
+                    ]
+                )
+            )
+            start = t_start.strftime("%H:%M")
+            end = t_end.strftime("%H:%M")
+            text = (
+                f"{dates}\n{start}-{end}\n"
+                # 同`str(booking)`中的写法
+                f"{format_datetime_range((t_start, t_end))}"
+            )
+            token = self._slot_tokens[key] = (
+                dates,
+                text,
+                _minutes(t_start),
+                _minutes(t_end),
+                int((t_end - t_start).total_seconds()) // 60,
+            )
+        return token
+
+    def extend(self, bookings: Iterable[Booking]) -> range:
+        """追加若干项
+
+        之前的搜索结果会失效。
+
+        :return: 新增项的下标
+        """
+
+        offset = len(self.bookings)
+        for b in bookings:
+            room = self._room_token(b)
+            dates, text, start, end, duration = self._slot_token(b)
+
+            self.bookings.append(b)
+            self._rooms.append(room)
+            self._dates.append(dates)
+            self._texts.append(f"{room}\n{text}")
+            self._starts.append(start)
+            self._ends.append(end)
+            self._durations.append(duration)
+
+        self._history.clear()
+        return range(offset, len(self.bookings))
+
+    def search(self, keyword: str, *, among: Iterable[int] | None = None) -> list[int]:
+        """搜索
+
+        :param among: 只在这些下标中查找；默认为全部，且会利用、记录之前的结果
+        :return: 符合的下标，按原顺序
+        """
+
+        terms = parse_query(keyword)
+
+        if among is not None:
+            return self._filter(among, terms)
+
+        candidates: Iterable[int] = range(len(self.bookings))
+        n_candidates = len(self.bookings)
+        for i, (old, result) in enumerate(self._history):
+            if old == terms:
+                # 移到最后，表示最近用过
+                self._history.append(self._history.pop(i))
+                return list(result)
+            if len(result) < n_candidates and _narrows(terms, old):
+                candidates = result
+                n_candidates = len(result)
+
+        found = self._filter(candidates, terms)
+        self._history.append((terms, found))
+        del self._history[: -self.history_size]
+        return list(found)
+
+    def _filter(self, indices: Iterable[int], terms: tuple[Term, ...]) -> list[int]:
+        """筛选出满足全部`terms`的下标"""
+
+        if not terms:
+            return list(indices)
+
+        columns = {
+            "text": self._texts,
+            "room": self._rooms,
+            "date": self._dates,
+            "start": self._starts,
+            "end": self._ends,
+            "duration": self._durations,
+        }
+        found = indices
+        for term in terms:
+            column = columns[term.field]
+            value = term.value
+            if term.op == "in":
+                found = [
+                    i for i in found if value in column[i]  # type: ignore[operator]
+                ]
+            else:
+                compare = _COMPARE[term.op]
+                found = [i for i in found if compare(column[i], value)]
+        return list(found)
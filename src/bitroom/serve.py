@@ -0,0 +1,389 @@
+"""本地服务
+
+多个脚本、TUI、终端各自登录、爬取时，同样的页会被反复请求，而服务器很慢。
+`bitroom serve`只登录一次，不断刷新，在内存中保存最新结果及索引，
+通过 localhost HTTP 提供查询；
+CLI、TUI 发现服务在运行，就直接向它查询，几毫秒即可得到结果。
+
+HTTP 只用标准库实现，客户端无需导入 httpx。
+
+## 接口
+
+均为`GET`，出错时返回 JSON：`{"error": ...}`。
+
+- `/status`：状态，如`{"ready": true, "since": "2023-05-01", ...}`
+- `/bookings`：可预约区间，按时间、房间排序
+- `/find?from=2023-05-07T14:00&to=2023-05-07T18:00`：同`bitroom find`
+
+后两者的参数：
+
+- `format`：同`bitroom show --format`，默认`json`
+- `until`：只要这天及以前的；超出服务保存的范围则返回 416，以便客户端自行爬取
+  （`/find`只按时长查找且已找到时除外）
+- `/find`还支持`to`、`cover`（`1`表示完整包含）、`duration`（分钟）、
+  `gap`（合并相邻时段的最大间隔，分钟）
+
+尚未获取完第一轮时，后两者返回 503。
+
+## 例子
+
+```
+server = BookingServer(connect, interval=60, n_weeks=4)
+await server.serve("127.0.0.1", 8726)
+```
+
+另一进程中：
+
+```
+body = await request(ServeConfig(), "/bookings", {"format": "binary"})
+if body is not None:
+    bookings = snapshot.load(body)
+```
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+from json import dumps, loads
+from time import time
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from . import snapshot
+from .index import BookingIndex
+from .room import coalesce, week_dates
+from .watch import Watcher
+
+if TYPE_CHECKING:
+    from asyncio import StreamReader, StreamWriter
+    from typing import Any, Awaitable, Callable, Literal
+
+    from .config import ServeConfig
+    from .room import Booking, RoomAPI
+
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+}
+
+_IO_TIMEOUT = 5.0
+"""读取请求、发送响应的超时，单位为秒；以免空闲或很慢的客户端一直占着连接"""
+_MAX_HEAD_SIZE = 8192
+"""请求行与请求头的最大字节数"""
+_MAX_INDICES = 4
+"""最多保留几种合并间隔下的索引；`gap`由客户端指定，不能无限增长"""
+
+_CONTENT_TYPES = {
+    "json": "application/json",
+    "jsonl": "application/jsonl",
+    "compact": "application/json",
+    "binary": "application/octet-stream",
+}
+
+
+class _HTTPError(Exception):
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class BookingServer:
+    """在内存中保存、不断刷新可预约区间，提供查询
+
+    刷新同`Watcher`：第`w`周（从 0 开始）每隔`interval * 2**w`秒获取一次。
+    """
+
+    connect: Callable[[], Awaitable[RoomAPI]]
+    """登录并构造`RoomAPI`；启动时及刷新出错后调用。`RoomAPI`不应设置`BookingCache`"""
+    interval: float
+    """本周的刷新间隔，单位为秒"""
+    n_weeks: int
+    """保存的周数"""
+    rooms_per_page: int | Literal["auto"]
+    on_error: Callable[[Exception], None] | None
+    """刷新出错时调用；出错的周保留之前的结果，稍后重试，必要时重新登录"""
+    bookings: list[Booking] | None
+    """最新的结果，按时间、房间排序；尚未获取完第一轮时为`None`"""
+    updated_at: float | None
+    """最近一次刷新完成的时刻，Unix 时间戳"""
+    _indices: dict[datetime.timedelta | None, BookingIndex]
+    """各合并间隔下的索引，用到时才建立，只保留最近用过的`_MAX_INDICES`个；
+    `None`表示不合并"""
+    _bodies: dict[tuple[str, datetime.date | None], bytes]
+    """`/bookings`各 (format, until) 的响应内容，用到时才编码"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[RoomAPI]],
+        *,
+        interval: float = 60,
+        n_weeks: int = 4,
+        rooms_per_page: int | Literal["auto"] = 3,
+        on_error: Callable[[Exception], None] | None = None,
+    ) -> None:
+        self.connect = connect
+        self.interval = interval
+        self.n_weeks = n_weeks
+        self.rooms_per_page = rooms_per_page
+        self.on_error = on_error
+        self.bookings = None
+        self.updated_at = None
+        self._indices = {}
+        self._bodies = {}
+
+    @property
+    def since(self) -> datetime.date:
+        """保存的第一天，即本周一"""
+        return week_dates(datetime.date.today())[0]
+
+    @property
+    def until(self) -> datetime.date:
+        """保存的最后一天"""
+        return self.since + datetime.timedelta(weeks=self.n_weeks, days=-1)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "ready": self.bookings is not None,
+            "since": self.since.isoformat(),
+            "until": self.until.isoformat(),
+            "n_bookings": len(self.bookings) if self.bookings is not None else 0,
+            "updated_at": self.updated_at,
+        }
+
+    def index(self, gap: datetime.timedelta | None = None) -> BookingIndex:
+        """`bookings`的索引
+
+        :param gap: 合并相邻时段时允许的最大间隔；`None`表示不合并
+        """
+
+        assert self.bookings is not None, "尚未获取完第一轮"
+
+        # 移到末尾，即最近用过
+        index = self._indices.pop(gap, None)
+        if index is None:
+            bookings = (
+                coalesce(self.bookings, gap=gap) if gap is not None else self.bookings
+            )
+            index = BookingIndex(bookings)
+            if len(self._indices) >= _MAX_INDICES:
+                del self._indices[next(iter(self._indices))]
+        self._indices[gap] = index
+        return index
+
+    async def refresh_forever(self) -> None:
+        """不断刷新；出错则稍后重试，必要时重新登录，期间仍提供之前的结果
+
+        只在结果有变化时替换`bookings`、清空索引与编码好的响应。
+        """
+
+        while True:
+            try:
+                watcher = Watcher(
+                    await self.connect(),
+                    interval=self.interval,
+                    n_weeks=self.n_weeks,
+                    rooms_per_page=self.rooms_per_page,
+                    connect=self.connect,
+                    on_error=self.on_error,
+                )
+                weeks = None
+                async for diff in watcher.watch(yield_empty=True):
+                    # 首次获取某周、某周已过去时，没有差异，但结果也变了
+                    if diff or watcher.weeks != weeks:
+                        weeks = watcher.weeks
+                        self.bookings = watcher.bookings
+                        self._indices = {}
+                        self._bodies = {}
+                    self.updated_at = time()
+            except Exception as error:
+                if self.on_error is not None:
+                    self.on_error(error)
+                await asyncio.sleep(self.interval)
+
+    async def serve(self, host: str, port: int) -> None:
+        """在`host:port`提供查询，同时不断刷新；一直运行"""
+
+        refresh = asyncio.ensure_future(self.refresh_forever())
+        try:
+            server = await asyncio.start_server(
+                self._handle, host, port, limit=_MAX_HEAD_SIZE
+            )
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresh.cancel()
+
+    async def _handle(self, reader: StreamReader, writer: StreamWriter) -> None:
+        try:
+            try:
+                request_line = await self._read_request_line(reader)
+                content_type, body = self._respond(request_line)
+                status = 200
+            except _HTTPError as error:
+                status = error.status
+                content_type = _CONTENT_TYPES["json"]
+                body = dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+                + body
+            )
+            await asyncio.wait_for(writer.drain(), timeout=_IO_TIMEOUT)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request_line(reader: StreamReader) -> str:
+        """读取请求行，跳过请求头（均用不到）
+
+        超时或过长则报错，以免空闲或恶意的客户端一直占着连接。
+        """
+
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), timeout=_IO_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise _HTTPError(408, f"{_IO_TIMEOUT} s 内未收到完整的请求")
+        except asyncio.LimitOverrunError:
+            raise _HTTPError(431, f"请求头超过 {_MAX_HEAD_SIZE} 字节")
+        return head.split(b"\r\n", 1)[0].decode("latin-1")
+
+    def _respond(self, request_line: str) -> tuple[str, bytes]:
+        """
+        :return: Content-Type，响应内容
+        """
+
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise _HTTPError(400, "无法解析请求")
+        if method != "GET":
+            raise _HTTPError(405, f"只支持 GET：{method}")
+
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+
+        if url.path == "/status":
+            return _CONTENT_TYPES["json"], dumps(self.status()).encode("utf-8")
+        if url.path not in ("/bookings", "/find"):
+            raise _HTTPError(404, f"未知接口：{url.path}")
+        if self.bookings is None:
+            raise _HTTPError(503, "尚未获取完第一轮，请稍后再试")
+
+        format = params.get("format", "json")
+        if format not in _CONTENT_TYPES:
+            raise _HTTPError(400, f"未知格式：{format}")
+
+        try:
+            until = (
+                datetime.date.fromisoformat(params["until"])
+                if "until" in params
+                else None
+            )
+            if url.path == "/bookings":
+                bookings = self.bookings
+            else:
+                bookings = self._find(params)
+                if "to" in params:
+                    t_end = datetime.datetime.fromisoformat(params["to"])
+                    until = max(until or t_end.date(), t_end.date())
+        except (KeyError, ValueError, AssertionError) as error:
+            raise _HTTPError(400, f"参数有误：{error!r}")
+
+        if url.path == "/bookings":
+            if until is not None and until > self.until:
+                raise _HTTPError(416, f"只保存到 {self.until}")
+            # 同样的请求常被反复发出，而结果在下次变化前不变
+            body = self._bodies.get((format, until))
+            if body is None:
+                if until is not None:
+                    bookings = [b for b in bookings if b.t_start.date() <= until]
+                body = self._bodies[format, until] = snapshot.dump(
+                    bookings, format  # type: ignore[arg-type]
+                )
+            return _CONTENT_TYPES[format], body
+
+        if until is not None:
+            bookings = [b for b in bookings if b.t_start.date() <= until]
+            # 只按时长查找最早的区间时，若已找到，更远的周里的不会更早
+            if until > self.until and ("to" in params or not bookings):
+                raise _HTTPError(416, f"只保存到 {self.until}")
+
+        body = snapshot.dump(bookings, format)  # type: ignore[arg-type]
+        return _CONTENT_TYPES[format], body
+
+    def _find(self, params: dict[str, str]) -> list[Booking]:
+        """按`/find`的参数查找"""
+
+        def minutes(key: str) -> datetime.timedelta | None:
+            return (
+                datetime.timedelta(minutes=int(params[key])) if key in params else None
+            )
+
+        return self.index(minutes("gap")).find(
+            datetime.datetime.fromisoformat(params["from"]),
+            datetime.datetime.fromisoformat(params["to"]) if "to" in params else None,
+            cover=params.get("cover") == "1",
+            duration=minutes("duration"),
+        )
+
+
+async def request(
+    config: ServeConfig, path: str, params: dict[str, str] | None = None
+) -> bytes | None:
+    """向本地服务查询
+
+    :param path: 接口，如`"/bookings"`
+    :return: 响应内容；若服务未运行、尚未就绪、不能回答或出错，返回`None`
+    """
+
+    target = f"{path}?{urlencode(params)}" if params else path
+
+    async def exchange() -> bytes:
+        reader, writer = await asyncio.open_connection(config.host, config.port)
+        try:
+            writer.write(
+                (
+                    f"GET {target} HTTP/1.1\r\n"
+                    f"Host: {config.host}:{config.port}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+            )
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    # 服务卡住时也不能让调用方一直等，应尽快改为自行爬取
+    try:
+        response = await asyncio.wait_for(exchange(), timeout=config.probe_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = head.split(b" ", 2)[1:2]
+    return body if status == [b"200"] else None
+
+
+async def status(config: ServeConfig) -> dict[str, Any] | None:
+    """本地服务的状态；若服务未运行，返回`None`"""
+    body = await request(config, "/status")
+    return loads(body) if body is not None else None
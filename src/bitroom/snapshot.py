@@ -0,0 +1,193 @@
+"""快照的序列化
+
+支持以下格式。
+
+- `json`：`[Booking.as_dict(), …]`，最初的格式，最易读。
+- `jsonl`：每行一个`Booking.as_dict()`，可流式写入、读取。
+- `compact`：JSON，房间表只写一次，各时段只记房间下标和分钟数。
+- `binary`：同`compact`，但二进制存储，带版本号。
+
+`compact`、`binary`基于`BookingTable`，时刻精确到分钟，且`FreeInterval`不保留各时段。
+"""
+
+from __future__ import annotations
+
+import datetime
+import struct
+from array import array
+from json import JSONDecodeError, dumps, loads
+from sys import byteorder
+from typing import TYPE_CHECKING
+
+from .room import Booking
+from .table import BookingTable
+
+if TYPE_CHECKING:
+    from typing import Iterable, Iterator, Literal
+
+    Format = Literal["json", "jsonl", "compact", "binary"]
+
+VERSION = 1
+"""`compact`、`binary`格式的版本"""
+MAGIC = b"BITROOM\x00"
+"""`binary`格式的文件头"""
+
+_HEADER = struct.Struct("<8sHq")
+"""文件头、版本、基准时刻（距 1970-01-01 00:00 的分钟数，不含时区）"""
+_COUNT = struct.Struct("<I")
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MINUTE = datetime.timedelta(minutes=1)
+
+
+def iter_jsonl(bookings: Iterable[Booking]) -> Iterator[str]:
+    """逐行生成`jsonl`格式"""
+    for b in bookings:
+        yield dumps(b.as_dict(), ensure_ascii=False)
+
+
+def dumps_compact(table: BookingTable) -> str:
+    """生成`compact`格式"""
+
+    slots = array("i", bytes(12 * len(table)))
+    slots[0::3] = table.rooms
+    slots[1::3] = table.starts
+    slots[2::3] = table.ends
+
+    return dumps(
+        {
+            "version": VERSION,
+            "base": table.base.isoformat(),
+            "rooms": list(zip(table.room_ids, table.room_names)),
+            "slots": slots.tolist(),
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def _loads_compact(raw: dict) -> BookingTable:
+    assert raw["version"] == VERSION, f"不支持的快照版本：{raw['version']}"
+
+    slots = array("i", raw["slots"])
+    return BookingTable(
+        base=datetime.datetime.fromisoformat(raw["base"]),
+        room_ids=[r[0] for r in raw["rooms"]],
+        room_names=[r[1] for r in raw["rooms"]],
+        rooms=slots[0::3],
+        starts=slots[1::3],
+        ends=slots[2::3],
+    )
+
+
+def _pack_str(s: str) -> bytes:
+    encoded = s.encode("utf-8")
+    return _COUNT.pack(len(encoded)) + encoded
+
+
+def dump_binary(table: BookingTable) -> bytes:
+    """生成`binary`格式
+
+    文件头、版本、基准时刻，然后是房间数、各房间编号与名称，最后是时段数、三列数据。
+    整数均为小端序。
+    """
+
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, (table.base - _EPOCH) // _MINUTE),
+        _COUNT.pack(len(table.room_ids)),
+    ]
+    for room_id, room_name in zip(table.room_ids, table.room_names):
+        parts += [_pack_str(room_id), _pack_str(room_name)]
+
+    parts.append(_COUNT.pack(len(table)))
+    for column in (table.rooms, table.starts, table.ends):
+        column = array("i", column)
+        if byteorder == "big":
+            column.byteswap()
+        parts.append(column.tobytes())
+
+    return b"".join(parts)
+
+
+def load_binary(data: bytes) -> BookingTable:
+    """读取`binary`格式"""
+
+    magic, version, base = _HEADER.unpack_from(data)
+    assert magic == MAGIC, "不是 bitroom 快照"
+    assert version == VERSION, f"不支持的快照版本：{version}"
+    offset = _HEADER.size
+
+    def read_count() -> int:
+        nonlocal offset
+        (n,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        return n
+
+    def read_str() -> str:
+        nonlocal offset
+        n = read_count()
+        s = data[offset : offset + n].decode("utf-8")
+        offset += n
+        return s
+
+    room_ids, room_names = [], []
+    for _ in range(read_count()):
+        room_ids.append(read_str())
+        room_names.append(read_str())
+
+    n_slots = read_count()
+    columns = []
+    for _ in range(3):
+        column = array("i")
+        column.frombytes(data[offset : offset + column.itemsize * n_slots])
+        if byteorder == "big":
+            column.byteswap()
+        offset += column.itemsize * n_slots
+        columns.append(column)
+
+    return BookingTable(
+        base=_EPOCH + base * _MINUTE,
+        room_ids=room_ids,
+        room_names=room_names,
+        rooms=columns[0],
+        starts=columns[1],
+        ends=columns[2],
+    )
+
+
+def dump(bookings: Iterable[Booking], format: Format) -> bytes:
+    """按指定格式序列化"""
+
+    if format == "binary":
+        return dump_binary(BookingTable.from_bookings(bookings))
+    if format == "compact":
+        text = dumps_compact(BookingTable.from_bookings(bookings))
+    elif format == "jsonl":
+        text = "".join(line + "\n" for line in iter_jsonl(bookings))
+    elif format == "json":
+        text = dumps([b.as_dict() for b in bookings])
+    else:
+        raise ValueError(f"Unknown format: “{format}”")
+    return text.encode("utf-8")
+
+
+def load(data: bytes) -> list[Booking]:
+    """读取快照，自动识别格式"""
+
+    if data.startswith(MAGIC):
+        return list(load_binary(data))
+
+    text = data.decode("utf-8").strip()
+    if not text:
+        return []
+
+    try:
+        raw = loads(text)
+    except JSONDecodeError:
+        # 多行，只能是 jsonl
+        raw = None
+
+    if isinstance(raw, list):
+        return list(map(Booking.from_dict, raw))
+    if isinstance(raw, dict) and "version" in raw:
+        return list(_loads_compact(raw))
+    return [Booking.from_dict(loads(line)) for line in text.splitlines() if line]
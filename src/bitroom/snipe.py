@@ -0,0 +1,183 @@
+"""定时抢先预约
+
+热门房间开放后几秒就被约满。这里事先准备好表单，到点前确认登录、构造请求、预热连接，
+到点立即发出，使关键路径上只剩一次请求。
+
+## 例子
+
+```
+api = await RoomAPI.login(client, username, password)
+sniper = Sniper(
+    api,
+    bookings,
+    tel="13806491023",
+    applicant="Boltzmann",
+    connect=lambda: RoomAPI.login(client, username, password),
+)
+result = await sniper.fire_at(datetime(2023, 5, 8, 8, 0), retries=3)
+print(result)
+```
+"""
+
+from __future__ import annotations
+
+import datetime
+from asyncio import sleep
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Awaitable, Callable
+
+    from httpx import Request
+
+    from .room import Booking, RoomAPI
+
+
+@dataclass
+class SnipeResult:
+    """抢先预约的结果"""
+
+    latencies: list[float] = field(default_factory=list)
+    """各次尝试的往返用时，单位为秒"""
+    lateness: float = 0.0
+    """第一次发出比预定时刻晚多少秒，负数表示提前"""
+    error: Exception | None = None
+    """最后一次尝试的异常；`None`表示成功"""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def attempts(self) -> int:
+        return len(self.latencies)
+
+    def __str__(self) -> str:
+        status = "成功" if self.ok else f"失败（{self.error}）"
+        return (
+            f"<SnipeResult {status}，尝试 {self.attempts} 次，"
+            f"晚 {self.lateness * 1e3:.1f} ms 发出，"
+            f"往返用时 {', '.join(f'{t * 1e3:.0f}' for t in self.latencies)} ms>"
+        )
+
+
+class Sniper:
+    """定时预约器
+
+    构造时即准备好表单；`fire_at`在预定时刻前`warm`，到点发出。
+    """
+
+    api: RoomAPI
+    connect: Callable[[], Awaitable[RoomAPI]] | None
+    """重新登录，返回新的`RoomAPI`；为`None`则登录失效时报错"""
+    _form: dict[str, str]
+    _request: Request | None
+    """`warm`时构造，因为请求带有构造时的 cookie"""
+
+    def __init__(
+        self,
+        api: RoomAPI,
+        booking: Booking | list[Booking],
+        *,
+        tel: str,
+        applicant: str,
+        description: str | None = None,
+        remark: str | None = None,
+        connect: Callable[[], Awaitable[RoomAPI]] | None = None,
+    ) -> None:
+        """
+        :param api: 已登录的`RoomAPI`
+        :param booking, tel, applicant, description, remark: 同`RoomAPI.book`
+        :param connect: 重新登录，如`lambda: RoomAPI.login(client, username, password)`
+        """
+
+        self.api = api
+        self.connect = connect
+        self._request = None
+        self._form = api.book_form(
+            booking,
+            tel=tel,
+            applicant=applicant,
+            description=description,
+            remark=remark,
+        )
+
+    async def warm(self) -> None:
+        """确认仍处于登录状态（否则用`connect`重新登录），建立连接，再构造请求"""
+
+        if not await self.api.ping():
+            assert self.connect is not None, "登录状态已失效，请重新登录"
+            self.api = await self.connect()
+        self._request = self.api.build_form_request(self._form)
+
+    async def fire(
+        self, *, retries: int = 0, retry_interval: float = 0.05
+    ) -> SnipeResult:
+        """立即发出
+
+        :param retries: 失败后最多重试几次
+        :param retry_interval: 重试前等待的时间，单位为秒
+
+        若还未`warm`，先`warm`。
+        """
+
+        if self._request is None:
+            await self.warm()
+        request = self._request
+        assert request is not None
+
+        result = SnipeResult()
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                await sleep(retry_interval)
+
+            t_start = perf_counter()
+            try:
+                await self.api.send_book_request(request)
+                result.error = None
+            except Exception as error:
+                result.error = error
+            result.latencies.append(perf_counter() - t_start)
+
+            if result.ok:
+                break
+        return result
+
+    async def fire_at(
+        self,
+        when: datetime.datetime,
+        *,
+        lead: float = 0.0,
+        warm_up: float = 3.0,
+        spin: float = 0.005,
+        retries: int = 0,
+        retry_interval: float = 0.05,
+    ) -> SnipeResult:
+        """在预定时刻发出
+
+        :param when: 预定时刻，本地时间
+        :param lead: 提前多少秒发出，以抵消网络单程延迟
+        :param warm_up: 提前多少秒预热连接；不宜太早，否则连接可能已因空闲而断开
+        :param spin: 最后多少秒忙等待，以免`asyncio.sleep`不够精确
+        :param retries, retry_interval: 同`fire`
+        """
+
+        def remaining() -> float:
+            """距发出还有多少秒"""
+            return (when - datetime.datetime.now()).total_seconds() - lead
+
+        await sleep(max(0, remaining() - warm_up))
+        await self.warm()
+
+        await sleep(max(0, remaining() - spin))
+        # 换算为高精度计时器
+        deadline = perf_counter() + remaining()
+        while perf_counter() < deadline:
+            pass
+
+        lateness = perf_counter() - deadline
+        result = await self.fire(retries=retries, retry_interval=retry_interval)
+        result.lateness = lateness
+        return result
@@ -0,0 +1,308 @@
+"""按列存储的可预约时空区间
+
+几周内所有房间的时段可达数万个，逐个`Booking`存储既占内存又慢。
+这里按列存储：房间编号、名称只存一次，时刻存为相对基准时刻的分钟数。
+"""
+
+from __future__ import annotations
+
+import datetime
+from array import array
+from functools import cache
+from typing import TYPE_CHECKING, overload
+
+from .room import Booking
+
+if TYPE_CHECKING:
+    from types import ModuleType
+    from typing import Any, Iterable, Iterator, Sequence
+
+_MINUTE = datetime.timedelta(minutes=1)
+
+
+@cache
+def _numpy() -> ModuleType | None:
+    """NumPy；未安装则为`None`"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class BookingTable:
+    """按列存储的一组可预约时空区间
+
+    取出单个元素时才构造`Booking`。时刻精确到分钟；`FreeInterval`只保留首尾，不保留各时段。
+    筛选、排序、分组均返回新表，新表与原表共享房间列表。
+
+    若安装了 NumPy（`bitroom[numpy]`），筛选、排序、分组都整列向量化处理；
+    否则逐行处理，排序时把 (时刻, 房间) 编码为整数键。
+
+    ## 例子
+
+    ```
+    table = BookingTable.from_bookings(bookings)
+    afternoon = table.filter(after=datetime(2023, 5, 7, 14), min_duration=90)
+    for room_id, group in afternoon.group_by_room().items():
+        print(room_id, len(group), group[0])
+    ```
+    """
+
+    base: datetime.datetime
+    """基准时刻，`starts`、`ends`相对于它"""
+    room_ids: list[str]
+    room_names: list[str]
+    rooms: array
+    """各时段所属房间在`room_ids`中的下标"""
+    starts: array
+    """各时段开始时刻，相对于`base`的分钟数"""
+    ends: array
+    """各时段结束时刻，相对于`base`的分钟数"""
+
+    def __init__(
+        self,
+        *,
+        base: datetime.datetime,
+        room_ids: list[str],
+        room_names: list[str],
+        rooms: array,
+        starts: array,
+        ends: array,
+    ) -> None:
+        """
+        一般请用`from_bookings`。
+        """
+
+        assert len(rooms) == len(starts) == len(ends)
+
+        self.base = base
+        self.room_ids = room_ids
+        self.room_names = room_names
+        self.rooms = rooms
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_bookings(cls, bookings: Iterable[Booking]) -> BookingTable:
+        bookings = list(bookings)
+        base = min(
+            (b.t_start for b in bookings), default=datetime.datetime(2000, 1, 1)
+        ).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        room_index: dict[str, int] = {}
+        room_ids: list[str] = []
+        room_names: list[str] = []
+        rooms = array("i")
+        starts = array("i")
+        ends = array("i")
+
+        for b in bookings:
+            r = room_index.get(b.room_id)
+            if r is None:
+                r = room_index[b.room_id] = len(room_ids)
+                room_ids.append(b.room_id)
+                room_names.append(b.room_name)
+
+            rooms.append(r)
+            starts.append((b.t_start - base) // _MINUTE)
+            ends.append((b.t_end - base) // _MINUTE)
+
+        return BookingTable(
+            base=base,
+            room_ids=room_ids,
+            room_names=room_names,
+            rooms=rooms,
+            starts=starts,
+            ends=ends,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def _booking(self, i: int) -> Booking:
+        r = self.rooms[i]
+        return Booking(
+            room_name=self.room_names[r],
+            room_id=self.room_ids[r],
+            t_start=self.base + self.starts[i] * _MINUTE,
+            t_end=self.base + self.ends[i] * _MINUTE,
+        )
+
+    @overload
+    def __getitem__(self, i: int) -> Booking:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> BookingTable:
+        ...
+
+    def __getitem__(self, i: int | slice) -> Booking | BookingTable:
+        if isinstance(i, slice):
+            return self._with_columns(self.rooms[i], self.starts[i], self.ends[i])
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._booking(i)
+
+    def __iter__(self) -> Iterator[Booking]:
+        return map(self._booking, range(len(self)))
+
+    def _minutes(self, t: datetime.datetime) -> int:
+        return (t - self.base) // _MINUTE
+
+    def _with_columns(self, rooms: array, starts: array, ends: array) -> BookingTable:
+        return BookingTable(
+            base=self.base,
+            room_ids=self.room_ids,
+            room_names=self.room_names,
+            rooms=rooms,
+            starts=starts,
+            ends=ends,
+        )
+
+    def _views(self, np: Any) -> tuple[Any, Any, Any]:
+        """各列的 NumPy 视图，不复制"""
+        return tuple(  # type: ignore[return-value]
+            np.frombuffer(col, dtype=f"i{col.itemsize}")
+            for col in (self.rooms, self.starts, self.ends)
+        )
+
+    def _take_numpy(self, np: Any, selector: Any) -> BookingTable:
+        """按 NumPy 下标数组或布尔掩码选取，组成新表"""
+        return self._with_columns(
+            *(array("i", view[selector].tobytes()) for view in self._views(np))
+        )
+
+    def take(self, indices: Sequence[int]) -> BookingTable:
+        """按下标选取，组成新表"""
+
+        rooms, starts, ends = self.rooms, self.starts, self.ends
+        return self._with_columns(
+            array("i", [rooms[i] for i in indices]),
+            array("i", [starts[i] for i in indices]),
+            array("i", [ends[i] for i in indices]),
+        )
+
+    def filter(
+        self,
+        *,
+        room_ids: Iterable[str] | None = None,
+        after: datetime.datetime | None = None,
+        before: datetime.datetime | None = None,
+        min_duration: int | None = None,
+    ) -> BookingTable:
+        """筛选
+
+        :param room_ids: 只保留这些房间
+        :param after: 只保留不早于此时刻开始的
+        :param before: 只保留不晚于此时刻结束的
+        :param min_duration: 只保留不短于此时长的，单位为分钟
+        """
+
+        wanted: set[int] | None = None
+        if room_ids is not None:
+            room_ids = set(room_ids)
+            wanted = {r for r, r_id in enumerate(self.room_ids) if r_id in room_ids}
+
+        np = _numpy()
+        if np is not None and self:
+            rooms, starts, ends = self._views(np)
+            mask = np.ones(len(self), dtype=bool)
+            if wanted is not None:
+                wanted_mask = np.zeros(len(self.room_ids), dtype=bool)
+                wanted_mask[list(wanted)] = True
+                mask &= wanted_mask[rooms]
+            if after is not None:
+                mask &= starts >= self._minutes(after)
+            if before is not None:
+                mask &= ends <= self._minutes(before)
+            if min_duration is not None:
+                mask &= ends - starts >= min_duration
+            return self._take_numpy(np, mask)
+
+        # 逐个条件缩小范围
+        indices: Iterable[int] = range(len(self))
+        if wanted is not None:
+            rooms = self.rooms
+            indices = [i for i in indices if rooms[i] in wanted]
+        if after is not None:
+            t, starts = self._minutes(after), self.starts
+            indices = [i for i in indices if starts[i] >= t]
+        if before is not None:
+            t, ends = self._minutes(before), self.ends
+            indices = [i for i in indices if ends[i] <= t]
+        if min_duration is not None:
+            starts, ends = self.starts, self.ends
+            indices = [i for i in indices if ends[i] - starts[i] >= min_duration]
+
+        return self.take(indices if isinstance(indices, list) else list(indices))
+
+    def sort(self, by: str = "t_start") -> BookingTable:
+        """排序
+
+        :param by: `"t_start"`（按时间，再按房间）或`"room"`（按房间，再按时间）
+        """
+
+        if by not in ("t_start", "room"):
+            raise ValueError(f"Unknown sort key: “{by}”")
+        if not self:
+            return self[:]
+
+        # 房间按`room_id`的名次参与排序
+        ranks = [0] * len(self.room_ids)
+        for rank, r in enumerate(
+            sorted(range(len(self.room_ids)), key=self.room_ids.__getitem__)
+        ):
+            ranks[r] = rank
+
+        np = _numpy()
+        if np is not None:
+            rooms, starts, _ = self._views(np)
+            room_ranks = np.array(ranks)[rooms]
+            # `lexsort`以最后一个键为主键
+            keys = (room_ranks, starts) if by == "t_start" else (starts, room_ranks)
+            return self._take_numpy(np, np.lexsort(keys))
+
+        # 把 (时刻, 房间) 或 (房间, 时刻) 编码为一个整数，避免逐行构造元组
+        n_rooms = len(ranks)
+        if by == "t_start":
+            keys = [s * n_rooms + ranks[r] for s, r in zip(self.starts, self.rooms)]
+        else:
+            lowest = min(self.starts)
+            span = max(self.starts) - lowest + 1
+            keys = [
+                ranks[r] * span + s - lowest for s, r in zip(self.starts, self.rooms)
+            ]
+        return self.take(sorted(range(len(self)), key=keys.__getitem__))
+
+    def group_by_room(self) -> dict[str, BookingTable]:
+        """按房间分组
+
+        :return: `room_id`到该房间各时段的映射，按各房间首次出现的顺序
+        """
+
+        np = _numpy()
+        if np is not None and self:
+            rooms, _, _ = self._views(np)
+            # 按房间稳定排序，各房间内仍保持原顺序，再切分
+            order = np.argsort(rooms, kind="stable")
+            present, first, counts = np.unique(
+                rooms, return_index=True, return_counts=True
+            )
+            bounds = [0, *np.cumsum(counts).tolist()]
+            present = present.tolist()
+            return {
+                self.room_ids[present[k]]: self._take_numpy(
+                    np, order[bounds[k] : bounds[k + 1]]
+                )
+                for k in np.argsort(first).tolist()
+            }
+
+        groups: dict[int, list[int]] = {}
+        for i, r in enumerate(self.rooms):
+            groups.setdefault(r, []).append(i)
+
+        return {self.room_ids[r]: self.take(indices) for r, indices in groups.items()}
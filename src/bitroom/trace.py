@@ -0,0 +1,129 @@
+"""请求级别的跟踪、计时
+
+一次爬取耗时几十秒，时间花在登录、试探、某页请求还是解析上？这里记录每一步的用时等信息，
+以便按真实数据调节并发数、每页房间数。
+
+## 例子
+
+```
+tracer = Tracer(hooks=[print])  # 每完成一步就调用钩子
+api = await RoomAPI.login(client, username, password, tracer=tracer)
+await api.fetch_bookings(date.today())
+
+print(tracer.summary())
+tracer.dump(Path("trace.json"))
+```
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from json import dumps
+from statistics import mean
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Any, Callable, Iterator
+
+
+@dataclass
+class Span:
+    """一步操作"""
+
+    name: str
+    """操作种类，如`"post"`、`"auth"`、`"parse"`"""
+    start: float
+    """开始时刻，距`Tracer`创建的秒数"""
+    duration: float
+    """用时，单位为秒"""
+    attributes: dict[str, Any] = field(default_factory=dict)
+    """其它信息，如`endpoint`、`page`、`page_size`、`bytes`、`status`、`error`"""
+
+
+class Tracer:
+    """收集各步操作的`Span`"""
+
+    spans: list[Span]
+    hooks: list[Callable[[Span], None]]
+    """每完成一步，依次调用"""
+    _t0: float
+
+    def __init__(self, hooks: list[Callable[[Span], None]] | None = None) -> None:
+        self.spans = []
+        self.hooks = list(hooks or [])
+        self._t0 = perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """记录一步操作
+
+        产生的字典即`Span.attributes`，可在操作过程中补充信息。
+        若抛出异常，会记入`error`，然后继续抛出。
+        """
+
+        start = perf_counter()
+        try:
+            yield attributes
+        except BaseException as error:
+            attributes["error"] = type(error).__name__
+            raise
+        finally:
+            span = Span(
+                name=name,
+                start=start - self._t0,
+                duration=perf_counter() - start,
+                attributes=attributes,
+            )
+            self.spans.append(span)
+            for hook in self.hooks:
+                hook(span)
+
+    def summary(self) -> str:
+        """按操作种类、接口汇总的表格"""
+
+        groups: dict[tuple[str, str], list[Span]] = {}
+        for s in self.spans:
+            key = (s.name, str(s.attributes.get("endpoint", "")))
+            groups.setdefault(key, []).append(s)
+
+        header = (
+            f"{'name':<8} {'endpoint':<24} {'count':>5} {'errors':>6} "
+            f"{'total/s':>8} {'mean/s':>7} {'max/s':>7} {'KiB':>8}"
+        )
+        lines = [header, "-" * len(header)]
+        for (name, endpoint), spans in sorted(groups.items()):
+            durations = [s.duration for s in spans]
+            n_bytes = sum(s.attributes.get("bytes", 0) for s in spans)
+            n_errors = sum("error" in s.attributes for s in spans)
+            lines.append(
+                f"{name:<8} {endpoint:<24} {len(spans):>5} {n_errors:>6} "
+                f"{sum(durations):>8.2f} {mean(durations):>7.2f} "
+                f"{max(durations):>7.2f} {n_bytes / 1024:>8.1f}"
+            )
+        if self.spans:
+            wall = max(s.start + s.duration for s in self.spans) - min(
+                s.start for s in self.spans
+            )
+            lines.append(f"wall time: {wall:.2f} s")
+        return "\n".join(lines)
+
+    def dump(self, path: Path) -> None:
+        """按 JSON 保存所有`Span`"""
+        path.write_text(
+            dumps({"spans": [asdict(s) for s in self.spans]}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+
+
+@contextmanager
+def trace(tracer: Tracer | None, name: str, **attributes: Any) -> Iterator[dict]:
+    """同`Tracer.span`；若`tracer`为`None`，则不记录"""
+
+    if tracer is None:
+        yield attributes
+    else:
+        with tracer.span(name, **attributes) as attributes:
+            yield attributes
@@ -5,29 +5,283 @@ Dependencies in group “tui” are required.
 
 from __future__ import annotations
 
-from datetime import date
-from json import load
+import datetime
+from bisect import bisect_right
+from math import ceil
 from pathlib import Path
-from time import sleep
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar
 
-from httpx import AsyncClient
-from more_itertools import chunked
+from rich.segment import Segment
+from rich.style import Style
 from textual import on, work
 from textual.app import App
+from textual.binding import Binding
 from textual.containers import Grid
+from textual.geometry import Size
+from textual.message import Message
+from textual.reactive import reactive
 from textual.screen import Screen
-from textual.widgets import Button, Footer, Header, Input, Label, OptionList
-from textual.widgets.option_list import Option
-from textual.worker import get_current_worker
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.widgets import Button, Footer, Header, Input, Label
 
-from . import Booking, RoomAPI, auth
+from . import Booking, BookingCache, RoomAPI, RoomCatalog, SessionStore, snapshot
+from .client import build_client
 from .config import read_config
+from .room import week_dates
+from .search import SearchIndex
+from .serve import request
+from .watch import booking_key, index_bookings
 
 if TYPE_CHECKING:
+    from typing import AsyncIterator, Callable, Iterable
+
+    from httpx import AsyncClient
+    from textual import events
     from textual.app import ComposeResult
+    from textual.binding import BindingType
 
     from .config import Config
+    from .watch import Key
+
+
+_N_WEEKS = 2
+"""刷新的周数"""
+_ROOMS_PER_PAGE = 3
+
+
+def _display_key(booking: Booking) -> tuple[datetime.date, str, datetime.datetime]:
+    """列表中的顺序：按周、房间、时刻，同`BookingCache.snapshot`"""
+    date = booking.t_start.date()
+    return (
+        date - datetime.timedelta(days=date.weekday()),
+        booking.room_id,
+        booking.t_start,
+    )
+
+
+class BookingList(ScrollView, can_focus=True):
+    """可预约时空区间的列表
+
+    只保存`bookings`与要显示的下标，只渲染可见的行，行的文字用到时才生成。
+    因此无论有多少项，更换显示的内容都只需常数时间。
+    """
+
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("up", "cursor_up", "Up", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+        Binding("page_down", "page_down", "Page Down", show=False),
+        Binding("page_up", "page_up", "Page Up", show=False),
+        Binding("enter", "select", "Select", show=False),
+    ]
+
+    COMPONENT_CLASSES: ClassVar[set[str]] = {"booking-list--highlighted"}
+
+    DEFAULT_CSS = """
+    BookingList {
+        height: 1fr;
+        background: $boost;
+        color: $text;
+        overflow-x: hidden;
+        border: tall transparent;
+        padding: 0 1;
+    }
+
+    BookingList:focus {
+        border: tall $accent;
+    }
+
+    BookingList > .booking-list--highlighted {
+        text-style: bold;
+    }
+
+    BookingList:focus > .booking-list--highlighted {
+        background: $accent;
+    }
+    """
+
+    bookings: list[Booking]
+    matched: list[int]
+    """要显示的各项在`bookings`中的下标"""
+    highlighted: reactive[int | None] = reactive["int | None"](None)
+    """高亮的行，即`matched`中的位置"""
+
+    class Selected(Message):
+        """选中了某项"""
+
+        booking: Booking
+
+        def __init__(self, booking: Booking) -> None:
+            super().__init__()
+            self.booking = booking
+
+    def __init__(
+        self,
+        bookings: list[Booking],
+        matched: list[int] | None = None,
+        *,
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+    ) -> None:
+        """
+        :param matched: 要显示的各项的下标；默认全部显示
+        """
+
+        super().__init__(name=name, id=id, classes=classes)
+        self.update(bookings, matched)
+
+    def update(self, bookings: list[Booking], matched: list[int] | None = None) -> None:
+        """更换显示的内容
+
+        `matched`之后归此列表所有，调用者不应再修改。
+        """
+
+        self.bookings = bookings
+        self.matched = list(range(len(bookings))) if matched is None else matched
+        self.virtual_size = Size(0, len(self.matched))
+        self.highlighted = 0 if self.matched else None
+        self.scroll_to(y=0, animate=False)
+        self.refresh()
+
+    def insert(
+        self, indices: Iterable[int], *, key: Callable[[Booking], object]
+    ) -> None:
+        """插入显示若干项
+
+        `matched`应已按`key`排序，各项插入到相应位置。
+        高亮的项、可见的项保持不变。
+
+        :param indices: 各项在`bookings`中的下标，`bookings`应已包含它们
+        """
+
+        top = round(self.scroll_y)
+        highlighted = self.highlighted
+        n_rows = len(self.matched)
+
+        for i in indices:
+            row = bisect_right(
+                self.matched, key(self.bookings[i]), key=lambda j: key(self.bookings[j])
+            )
+            self.matched.insert(row, i)
+            if highlighted is not None and row <= highlighted:
+                highlighted += 1
+            # 插在首个可见项处也会把它挤下去
+            if row <= top:
+                top += 1
+
+        if len(self.matched) != n_rows:
+            self._restore(top, highlighted)
+
+    def remove(self, indices: set[int]) -> None:
+        """不再显示若干项
+
+        高亮的项若被移除，则高亮原来的下一项。其余高亮的项、可见的项保持不变。
+
+        :param indices: 各项在`bookings`中的下标
+        """
+
+        top = round(self.scroll_y)
+        highlighted = self.highlighted
+
+        kept = []
+        n_above_top = 0
+        n_above_highlighted = 0
+        for row, i in enumerate(self.matched):
+            if i in indices:
+                if highlighted is not None and row < highlighted:
+                    n_above_highlighted += 1
+                if row < top:
+                    n_above_top += 1
+            else:
+                kept.append(i)
+
+        if len(kept) != len(self.matched):
+            self.matched = kept
+            self._restore(
+                top - n_above_top,
+                highlighted - n_above_highlighted if highlighted is not None else None,
+            )
+
+    def _restore(self, top: int, highlighted: int | None) -> None:
+        """更改`matched`后，恢复滚动位置、高亮"""
+        self.virtual_size = Size(0, len(self.matched))
+        self.scroll_to(y=top, animate=False)
+        self.highlighted = (
+            highlighted if highlighted is not None or not self.matched else 0
+        )
+        self.refresh()
+
+    @property
+    def highlighted_booking(self) -> Booking | None:
+        if self.highlighted is None:
+            return None
+        return self.bookings[self.matched[self.highlighted]]
+
+    def render_line(self, y: int) -> Strip:
+        row = self.scroll_offset.y + y
+        width = self.scrollable_content_region.width
+        if row >= len(self.matched):
+            return Strip.blank(width, self.rich_style)
+
+        style = self.rich_style + Style.from_meta({"row": row})
+        if row == self.highlighted:
+            style += self.get_component_rich_style("booking-list--highlighted")
+
+        text = str(self.bookings[self.matched[row]])
+        return Strip([Segment(text, style)]).adjust_cell_length(width, style)
+
+    def validate_highlighted(self, highlighted: int | None) -> int | None:
+        if not self.matched or highlighted is None:
+            return None
+        return max(0, min(highlighted, len(self.matched) - 1))
+
+    def watch_highlighted(self, old: int | None, new: int | None) -> None:
+        if new is not None:
+            top = round(self.scroll_y)
+            height = self.scrollable_content_region.height
+            if new < top:
+                self.scroll_to(y=new, animate=False)
+            elif height and new >= top + height:
+                self.scroll_to(y=new - height + 1, animate=False)
+        self.refresh()
+
+    def _on_click(self, event: events.Click) -> None:
+        row = event.style.meta.get("row")
+        if row is not None:
+            self.highlighted = row
+            self.action_select()
+
+    def _move(self, rows: int) -> None:
+        if self.highlighted is None:
+            self.highlighted = 0
+        else:
+            self.highlighted += rows
+
+    def action_cursor_down(self) -> None:
+        self._move(1)
+
+    def action_cursor_up(self) -> None:
+        self._move(-1)
+
+    def action_first(self) -> None:
+        self.highlighted = 0
+
+    def action_last(self) -> None:
+        self.highlighted = len(self.matched) - 1
+
+    def action_page_down(self) -> None:
+        self._move(max(1, self.scrollable_content_region.height))
+
+    def action_page_up(self) -> None:
+        self._move(-max(1, self.scrollable_content_region.height))
+
+    def action_select(self) -> None:
+        booking = self.highlighted_booking
+        if booking is not None:
+            self.post_message(self.Selected(booking))
 
 
 class RoomApp(App):
@@ -43,30 +297,83 @@ class RoomApp(App):
     ]
 
     config: Config
+    cache: BookingCache
+    client: AsyncClient
+    """整个应用共用，以复用连接"""
+    _api: RoomAPI | None
+    bookings_path: Path | None
     bookings: list[Booking]
-    bookings_matched_indices: list[int]
-    """Search result"""
+    """只增不减；消失的项记在`removed`中"""
+    removed: set[int]
+    """`bookings`中已消失的项的下标"""
+    in_order: bool
+    """`bookings`是否按`_display_key`排序；刷新时新增的项追加在末尾，会打乱顺序"""
+    search_index: SearchIndex
+    """`bookings`的搜索索引，载入数据时建立"""
+
+    def __init__(self, bookings_path: Path | None = None) -> None:
+        """
+        :param bookings_path: `bitroom show`的结果，任何格式均可；默认读取本地缓存
+        """
 
-    def __init__(self) -> None:
         super().__init__()
 
         config = read_config()
         assert config is not None
         self.config = config
 
-        with Path("bookings.json").open(encoding="utf-8") as f:
-            self.bookings = list(map(Booking.from_dict, load(f)))
-            self.bookings_matched_indices = list(range(len(self.bookings)))
+        self.cache = BookingCache()
+        self.client = build_client(config.http)
+        self._api = None
+        self.bookings_path = bookings_path
+        if bookings_path is None:
+            self.bookings = self.cache.snapshot()
+        else:
+            self.bookings = snapshot.load(bookings_path.read_bytes())
+        self.bookings.sort(key=_display_key)
+        self.removed = set()
+        self.in_order = True
+        self.search_index = SearchIndex(self.bookings)
 
     def compose(self) -> ComposeResult:
         yield Header()
 
-        yield Input(placeholder="Enter a City", id="search")
-        yield OptionList(*map(str, self.bookings), id="bookings")
+        yield Input(
+            placeholder="搜索，如“睿信 周六 after:14:00 dur>=90”",
+            id="search",
+        )
+        yield BookingList(self.bookings, id="bookings")
         # todo: display more info
 
         yield Footer()
 
+    def on_mount(self) -> None:
+        # 先显示本地缓存，同时在后台刷新；缓存中新鲜的页不必重新请求
+        if self.bookings_path is None or not self.bookings:
+            self._refresh_bookings(use_cache=True)
+
+    async def on_unmount(self) -> None:
+        await self.client.aclose()
+        self.cache.close()
+
+    async def api(self) -> RoomAPI:
+        """登录并构造`RoomAPI`，之后一直复用
+
+        登录状态、房间目录保存在本地，仍有效则不重新登录、不试探。
+        """
+
+        if self._api is None:
+            self._api = await RoomAPI.login(
+                self.client,
+                self.config.username,
+                self.config.password,
+                session=SessionStore(),
+                cache=self.cache,
+                catalog=RoomCatalog.load(),
+                page_timeout=self.config.http.page_timeout,
+            )
+        return self._api
+
     def action_toggle_dark(self) -> None:
         """切换深色模式"""
         self.dark = not self.dark
@@ -75,93 +382,156 @@ class RoomApp(App):
     def search(self, message: Input.Changed) -> None:
         """搜索
 
-        搜索很快，但更新界面很慢，因此使用 worker 防抖。
+        搜索用预先建立的索引，更换列表内容只需常数时间，因此无需防抖。
         """
-        self._search(message.value)
 
-    @work(exclusive=True)
-    def _search(self, keyword: str) -> None:
-        worker = get_current_worker()
+        self.query_one("#bookings", BookingList).update(
+            self.bookings, self._search(message.value)
+        )
 
-        self.log(f"Receive keyword “{keyword}”, and debounce for 0.5 s.")
-        sleep(0.5)
+    def _search(self, keyword: str, among: Iterable[int] | None = None) -> list[int]:
+        """搜索，结果按`_display_key`排序，不含已消失的项"""
 
-        if worker.is_cancelled:
-            self.log(f"The search for “{keyword}” is cancelled.")
-            return
-        self.log(f"Start searching for “{keyword}”…")
+        matched = self.search_index.search(keyword, among=among)
+        if self.removed:
+            matched = [i for i in matched if i not in self.removed]
+        if not self.in_order:
+            matched.sort(key=lambda i: _display_key(self.bookings[i]))
+        return matched
 
-        # todo: More advanced search
-        result = (
-            i
-            for i, b in enumerate(self.bookings)
-            if all(k in str(b) for k in keyword.split())
-        )
+    async def action_refresh_bookings(self) -> None:
+        """刷新 bookings 数据"""
+        self._refresh_bookings()
 
-        option_list = self.query_one("#bookings", OptionList)
+    def on_booking_list_selected(self, message: BookingList.Selected) -> None:
+        self.push_screen(BookScreen(message.booking))
 
-        if worker.is_cancelled:
-            self.log(f"The search for “{keyword}” finished, but had been cancelled.")
-            return
+    @work(exclusive=True)
+    async def _refresh_bookings(self, *, use_cache: bool = False) -> None:
+        """刷新 bookings 数据
 
-        self.bookings_matched_indices = list(result)
-        option_list.clear_options()
+        列表仍显示原有数据，只更新变化的部分，保持高亮的项、滚动位置。
+        失败（如离线）时保留原有数据。
 
-        # `option_list.add_option()` always refreshes the widget, which can be slow.
-        # https://github.com/Textualize/textual/blob/14850d54a3f5fed878cff1ce2f5da08503a02932/src/textual/widgets/_option_list.py#L511-L531
-        #
-        # Here we add 100 options, refresh, add another 100, refresh, and so on.
-        for bookings_group in chunked(self.bookings_matched_indices, 100):
-            if worker.is_cancelled:
-                self.log(f"The search for “{keyword}” is cancelled halfway.")
-                return
+        :param use_cache: 是否直接使用缓存中新鲜的页；用户要求刷新时应一律重新请求
+        """
 
-            for b in bookings_group:
-                content = option_list._make_content(str(self.bookings[b]))
-                option_list._contents.append(content)
-                if isinstance(content, Option):
-                    option_list._options.append(content)
+        self.log("Start refreshing bookings…")
+        self.sub_title = "刷新中…"
 
-            option_list._refresh_content_tracking(force=True)
-            option_list.refresh()
+        try:
+            n_added, n_removed = await self._revalidate(use_cache=use_cache)
+        except Exception as error:
+            self.log(f"Failed to refresh bookings: {error!r}")
+            self.sub_title = f"刷新失败，仍显示之前的数据：{error!r}"
+            return
 
-        self.log(f"Finish the search for “{keyword}”.")
+        self.sub_title = f"已刷新：新增 {n_added} 项，消失 {n_removed} 项"
+        self.log("Bookings data is refreshed.")
 
-    async def action_refresh_bookings(self) -> None:
-        """刷新 bookings 数据"""
-        self._refresh_bookings()
+    async def _revalidate(self, *, use_cache: bool) -> tuple[int, int]:
+        """重新获取，把变化应用到列表
 
-    def on_option_list_option_selected(
-        self, message: OptionList.OptionSelected
-    ) -> None:
-        booking = self.bookings[self.bookings_matched_indices[message.option_index]]
-        self.push_screen(BookScreen(booking, self.config))
+        每获取完一页，就把其中新增且符合搜索的项插入列表；
+        全部获取完后，再移除消失的项。
 
-    @work(exclusive=True)
-    async def _refresh_bookings(self) -> None:
-        self.log("Start refreshing bookings…")
+        :param use_cache: 同`_iter_pages`
 
-        # 因刷新并不频繁，并不保持登录，而是每次重新登录。
-        async with AsyncClient() as client:
-            await auth(client, self.config.username, self.config.password)
-            api = await RoomAPI.build(client)
+        :return: 新增、消失的项数
+        """
 
-            self.bookings = await api.fetch_bookings(date.today())
-            self.log("Bookings data is refreshed.")
+        booking_list = self.query_one("#bookings", BookingList)
 
-            # Refresh search result
-            self._search(self.query_one("#search", Input).value)
+        today = datetime.date.today()
+        monday = week_dates(today)[0]
+        until = monday + datetime.timedelta(weeks=_N_WEEKS)
+        """刷新范围之后的第一天"""
+
+        # 刷新范围内原有的各项
+        stale = {
+            booking_key(b): i
+            for i, b in enumerate(self.bookings)
+            if i not in self.removed and monday <= b.t_start.date() < until
+        }
+        known = index_bookings(
+            b for i, b in enumerate(self.bookings) if i not in self.removed
+        )
+        seen: dict[Key, Booking] = {}
+        n_added = 0
+
+        async for bookings in self._iter_pages(today, use_cache=use_cache):
+            page = index_bookings(bookings)
+            seen.update(page)
+            added = [b for key, b in page.items() if key not in known]
+            if not added:
+                continue
+            known.update(page)
+
+            n_added += len(added)
+            self.bookings.extend(added)
+            self.in_order = False
+            new = self.search_index.extend(added)
+            keyword = self.query_one("#search", Input).value
+            booking_list.insert(self._search(keyword, among=new), key=_display_key)
+
+        # 全部获取完才能确定哪些消失了
+        removed = {i for key, i in stale.items() if key not in seen}
+        self.removed |= removed
+        booking_list.remove(removed)
+
+        return n_added, len(removed)
+
+    async def _iter_pages(
+        self, today: datetime.date, *, use_cache: bool
+    ) -> AsyncIterator[list[Booking]]:
+        """逐页获取本周起`_N_WEEKS`周，并在标题栏显示进度
+
+        若`bitroom serve`在运行，则直接向它要全部数据，作为一页。
+
+        :param use_cache: 是否直接使用缓存中新鲜的页；否则一律请求，结果仍写入缓存
+        """
+
+        monday = week_dates(today)[0]
+        body = await request(
+            self.config.serve,
+            "/bookings",
+            {
+                "format": "binary",
+                "until": (
+                    monday + datetime.timedelta(weeks=_N_WEEKS, days=-1)
+                ).isoformat(),
+            },
+        )
+        if body is not None:
+            yield snapshot.load(body)
+            return
+
+        api = await self.api()
+
+        n_pages = 0
+        async for bookings in api.iter_booking_pages(
+            today,
+            rooms_per_page=_ROOMS_PER_PAGE,
+            n_weeks=_N_WEEKS,
+            use_cache=use_cache,
+        ):
+            n_pages += 1
+            total = (
+                _N_WEEKS * ceil(api.catalog.total_count / _ROOMS_PER_PAGE)
+                if api.catalog.total_count
+                else "?"
+            )
+            self.sub_title = f"刷新中… {n_pages}/{total} 页"
+            yield bookings
 
 
 class BookScreen(Screen):
     booking: Booking
-    config: Config
 
-    def __init__(self, booking: Booking, config: Config) -> None:
+    def __init__(self, booking: Booking) -> None:
         super().__init__()
 
         self.booking = booking
-        self.config = config
 
     def compose(self) -> ComposeResult:
         yield Grid(
@@ -175,21 +545,20 @@ class BookScreen(Screen):
     async def book(self, message: Button.Pressed) -> None:
         self.log("Start booking…")
 
-        async with AsyncClient() as client:
-            await auth(client, self.config.username, self.config.password)
-            api = await RoomAPI.build(client)
+        assert isinstance(self.app, RoomApp)
+        api = await self.app.api()
 
-            await api.book(
-                self.booking,
-                # todo
-                tel="13806491023",
-                applicant="Boltzmann",
-            )
+        await api.book(
+            self.booking,
+            # todo
+            tel="13806491023",
+            applicant="Boltzmann",
+        )
 
-            # todo: Visualize result
-            self.log("Booked successfully.")
+        # todo: Visualize result
+        self.log("Booked successfully.")
 
-            self.app.pop_screen()
+        self.app.pop_screen()
 
     @on(Button.Pressed, "#cancel")
     def cancel(self, message: Button.Pressed) -> None:
@@ -197,5 +566,7 @@ class BookScreen(Screen):
 
 
 if __name__ == "__main__":
-    app = RoomApp()
+    from sys import argv
+
+    app = RoomApp(Path(argv[1]) if len(argv) > 1 else None)
     app.run()
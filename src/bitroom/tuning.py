@@ -0,0 +1,160 @@
+"""自动调节每页房间数量、并发数
+
+服务器的状况因时而异，因此每次爬取都测量一下，逐步找出单位时间获取房间最多的设置。
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from json import dumps, loads
+from typing import TYPE_CHECKING
+
+from .config import cache_dir
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@dataclass
+class Observation:
+    """某一设置下的测量结果"""
+
+    rooms_per_page: int
+    max_concurrency: int
+    throughput: float
+    """每秒获取的房间数，多次测量的指数加权平均"""
+    n: int = 1
+    """测量次数"""
+
+
+@dataclass
+class PageTuner:
+    """每页房间数量、并发数的调节器
+
+    在当前最佳设置附近逐一尝试，若找到更快的设置就移过去，否则停留。
+
+    ## 例子
+
+    ```
+    tuner = PageTuner.load()
+    rooms_per_page, max_concurrency = tuner.suggest()
+    ...  # 按此设置爬取，测得每页平均用时 latency 秒
+    tuner.record(rooms_per_page, max_concurrency, latency=latency)
+    tuner.save()
+    ```
+
+    `save`时重新读取文件，再合并此后`record`的结果，因此同时进行的多次爬取互不覆盖。
+    """
+
+    observations: list[Observation] = field(default_factory=list)
+
+    initial: tuple[int, int] = (3, 4)
+    """没有任何测量时的设置"""
+    max_rooms_per_page: int = 10
+    max_max_concurrency: int = 8
+    alpha: float = 0.5
+    """新测量结果的权重；越大越快适应服务器的变化"""
+    _unsaved: list[tuple[int, int, float]] = field(
+        default_factory=list, repr=False, compare=False
+    )
+    """尚未保存的测量结果，(rooms_per_page, max_concurrency, throughput)"""
+
+    def _find(self, rooms_per_page: int, max_concurrency: int) -> Observation | None:
+        for o in self.observations:
+            if (o.rooms_per_page, o.max_concurrency) == (
+                rooms_per_page,
+                max_concurrency,
+            ):
+                return o
+        return None
+
+    def best(self) -> tuple[int, int]:
+        """目前测得最快的设置"""
+
+        if not self.observations:
+            return self.initial
+
+        o = max(self.observations, key=lambda o: o.throughput)
+        return o.rooms_per_page, o.max_concurrency
+
+    def suggest(self) -> tuple[int, int]:
+        """建议下次使用的设置
+
+        :return: (rooms_per_page, max_concurrency)
+
+        若最佳设置的相邻设置还有没测过的，就试一下；否则使用最佳设置。
+        """
+
+        s, c = self.best()
+        for candidate in [(s + 1, c), (s - 1, c), (s, c + 1), (s, c - 1)]:
+            if (
+                1 <= candidate[0] <= self.max_rooms_per_page
+                and 1 <= candidate[1] <= self.max_max_concurrency
+                and self._find(*candidate) is None
+            ):
+                return candidate
+        return s, c
+
+    def record(self, rooms_per_page: int, max_concurrency: int, *, latency: float):
+        """记录测量结果
+
+        :param rooms_per_page: 每页房间数量
+        :param max_concurrency: 并发数
+        :param latency: 每页平均用时，单位为秒
+        """
+
+        throughput = max_concurrency * rooms_per_page / latency
+        self._merge(rooms_per_page, max_concurrency, throughput)
+        self._unsaved.append((rooms_per_page, max_concurrency, throughput))
+
+    def _merge(
+        self, rooms_per_page: int, max_concurrency: int, throughput: float
+    ) -> None:
+        if o := self._find(rooms_per_page, max_concurrency):
+            o.throughput = self.alpha * throughput + (1 - self.alpha) * o.throughput
+            o.n += 1
+        else:
+            self.observations.append(
+                Observation(rooms_per_page, max_concurrency, throughput)
+            )
+
+    @staticmethod
+    def default_path() -> Path:
+        return cache_dir() / "tuning.json"
+
+    @classmethod
+    def load(cls, path: Path | None = None) -> PageTuner:
+        """读取之前的测量结果
+
+        文件不存在或不合法，则从头开始。
+        """
+
+        path = path or cls.default_path()
+        try:
+            raw = loads(path.read_text(encoding="utf-8"))
+            return PageTuner(
+                observations=[Observation(**o) for o in raw["observations"]]
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return PageTuner()
+
+    def save(self, path: Path | None = None) -> None:
+        """保存测量结果
+
+        以文件中最新的结果为准，合并上次保存以来`record`的结果，而非整个覆盖。
+        """
+
+        path = path or self.default_path()
+        self.observations = PageTuner.load(path).observations
+        for unsaved in self._unsaved:
+            self._merge(*unsaved)
+        self._unsaved = []
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写入临时文件再替换，以免其它进程读到写了一半的文件
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(
+            dumps({"observations": [asdict(o) for o in self.observations]}),
+            encoding="utf-8",
+        )
+        tmp.replace(path)
@@ -0,0 +1,242 @@
+"""监视可预约时空区间的变化
+
+定期重新获取，与上次的结果比较，只报告新增、消失的时段，以便及时发现有人取消预约。
+越近的周越常获取。
+"""
+
+from __future__ import annotations
+
+import datetime
+from asyncio import gather, sleep
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from .room import week_dates
+
+if TYPE_CHECKING:
+    from typing import AsyncGenerator, Awaitable, Callable, Iterable, Literal
+
+    from .room import Booking, RoomAPI
+
+    Key = tuple[str, datetime.datetime, datetime.datetime]
+
+
+_WEEK = datetime.timedelta(weeks=1)
+
+
+def booking_key(booking: Booking) -> Key:
+    """时空区间的键 (room_id, t_start, t_end)
+
+    `index_bookings`、`diff_bookings`均以此区分各项。
+    """
+    return (booking.room_id, booking.t_start, booking.t_end)
+
+
+def _sort_key(booking: Booking) -> tuple[datetime.datetime, str]:
+    return (booking.t_start, booking.room_id)
+
+
+@dataclass
+class BookingDiff:
+    """两次结果的差异"""
+
+    added: list[Booking] = field(default_factory=list)
+    """新增的时段，按时间、房间排序"""
+    removed: list[Booking] = field(default_factory=list)
+    """消失的时段，按时间、房间排序"""
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def as_dicts(self) -> list[dict[str, str]]:
+        """逐项转为`Booking.as_dict()`，并加上`"op"`：`"added"`或`"removed"`"""
+        return [{"op": "added", **b.as_dict()} for b in self.added] + [
+            {"op": "removed", **b.as_dict()} for b in self.removed
+        ]
+
+
+def diff_bookings(
+    old: Iterable[Booking] | dict[Key, Booking],
+    new: Iterable[Booking] | dict[Key, Booking],
+) -> BookingDiff:
+    """比较两次结果
+
+    以 (room_id, t_start, t_end) 为键建立散列索引，复杂度与数量成正比。
+
+    :param old: 上次的结果，或`index_bookings`建立的索引
+    :param new: 这次的结果，或`index_bookings`建立的索引
+    """
+
+    old = old if isinstance(old, dict) else index_bookings(old)
+    new = new if isinstance(new, dict) else index_bookings(new)
+
+    return BookingDiff(
+        added=sorted((b for k, b in new.items() if k not in old), key=_sort_key),
+        removed=sorted((b for k, b in old.items() if k not in new), key=_sort_key),
+    )
+
+
+def index_bookings(bookings: Iterable[Booking]) -> dict[Key, Booking]:
+    """以 (room_id, t_start, t_end) 为键建立散列索引"""
+    return {booking_key(b): b for b in bookings}
+
+
+class Watcher:
+    """定期获取，报告变化
+
+    第`w`周（从 0 开始）每隔`interval * 2**w`秒获取一次。
+    每周第一次获取的结果作为基准，不报告。
+
+    某周获取失败（如登录过期、服务器出错）时，保留该周上次的结果，到期再试；
+    若同时发现已不在登录状态，则用`connect`重新登录。
+
+    ## 例子
+
+    ```
+    watcher = Watcher(api, interval=60)
+    async for diff in watcher.watch():
+        for b in diff.added:
+            print("新增", b)
+    ```
+
+    也可用回调：
+
+    ```
+    await Watcher(api).run(lambda diff: print(diff.added))
+    ```
+    """
+
+    api: RoomAPI
+    interval: float
+    """最近一周的获取间隔，单位为秒"""
+    n_weeks: int
+    """监视的周数"""
+    rooms_per_page: int | Literal["auto"]
+    connect: Callable[[], Awaitable[RoomAPI]] | None
+    """重新登录，返回新的`RoomAPI`；为`None`则不重新登录"""
+    on_error: Callable[[Exception], None] | None
+    """获取失败时调用；为`None`则忽略"""
+    _snapshots: dict[datetime.date, dict[Key, Booking]]
+    """各周（以周一为键）上次的结果"""
+
+    def __init__(
+        self,
+        api: RoomAPI,
+        *,
+        interval: float = 60,
+        n_weeks: int = 2,
+        rooms_per_page: int | Literal["auto"] = 3,
+        connect: Callable[[], Awaitable[RoomAPI]] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+    ) -> None:
+        """
+        :param api: 不应设置`BookingCache`，否则有效期内获取不到变化；
+            `connect`返回的也一样
+        """
+
+        self.api = api
+        self.interval = interval
+        self.n_weeks = n_weeks
+        self.rooms_per_page = rooms_per_page
+        self.connect = connect
+        self.on_error = on_error
+        self._snapshots = {}
+
+    @property
+    def bookings(self) -> list[Booking]:
+        """各周上次的结果，按时间、房间排序"""
+        return sorted(
+            (b for snapshot in self._snapshots.values() for b in snapshot.values()),
+            key=_sort_key,
+        )
+
+    @property
+    def weeks(self) -> list[datetime.date]:
+        """已有结果的各周的周一，按时间排序"""
+        return sorted(self._snapshots)
+
+    async def poll(self, week: int) -> BookingDiff:
+        """获取一周，与上次比较
+
+        :param week: 第几周，0 表示本周
+        :return: 若为首次获取，则无差异
+        """
+
+        this_monday = week_dates(datetime.date.today())[0]
+        monday = this_monday + week * _WEEK
+        bookings = await self.api.fetch_bookings(
+            monday, rooms_per_page=self.rooms_per_page, n_weeks=1
+        )
+
+        new = index_bookings(bookings)
+        old = self._snapshots.get(monday)
+        self._snapshots[monday] = new
+        # 过去的周不会再获取
+        for past in [m for m in self._snapshots if m < this_monday]:
+            del self._snapshots[past]
+
+        return diff_bookings(old, new) if old is not None else BookingDiff()
+
+    async def watch(
+        self, *, yield_empty: bool = False
+    ) -> AsyncGenerator[BookingDiff, None]:
+        """不断获取，有变化时 yield
+
+        同时到期的几周合并为一次 yield。获取失败不会中断，见`Watcher`。
+
+        :param yield_empty: 无变化时也 yield，以便得知每轮获取已完成、`bookings`已更新；
+            全部失败的轮次不 yield
+        """
+
+        due = [0.0] * self.n_weeks
+        """各周下次获取的时刻"""
+
+        while True:
+            now = monotonic()
+            weeks = [w for w in range(self.n_weeks) if due[w] <= now]
+            results = await gather(
+                *(self.poll(w) for w in weeks), return_exceptions=True
+            )
+            # 失败的周也按时推迟，到期再试
+            for w in weeks:
+                due[w] = now + self.interval * 2**w
+
+            diffs = [r for r in results if isinstance(r, BookingDiff)]
+            errors = [r for r in results if not isinstance(r, BookingDiff)]
+            if errors:
+                await self._recover(errors)
+
+            diff = BookingDiff(
+                added=sorted((b for d in diffs for b in d.added), key=_sort_key),
+                removed=sorted((b for d in diffs for b in d.removed), key=_sort_key),
+            )
+            if diff or (yield_empty and diffs):
+                yield diff
+
+            await sleep(max(0, min(due) - monotonic()))
+
+    async def _recover(self, errors: list[BaseException]) -> None:
+        """报告错误；若已不在登录状态，则重新登录"""
+
+        for error in errors:
+            # 取消等不属于获取失败
+            if not isinstance(error, Exception):
+                raise error
+            if self.on_error is not None:
+                self.on_error(error)
+
+        if self.connect is None:
+            return
+        try:
+            if not await self.api.ping():
+                self.api = await self.connect()
+        except Exception as error:
+            # 下次失败时再试
+            if self.on_error is not None:
+                self.on_error(error)
+
+    async def run(self, callback: Callable[[BookingDiff], None]) -> None:
+        """不断获取，有变化时调用`callback`"""
+        async for diff in self.watch():
+            callback(diff)